@@ -3,6 +3,10 @@ const router = express.Router();
 const multer = require('multer');
 const path = require('path');
 const fs = require('fs');
+const axios = require('axios');
+
+// ML Service URL (FastAPI service running on port 8001)
+const ML_SERVICE_URL = 'http://localhost:8001';
 
 // Configure multer for file upload
 const storage = multer.diskStorage({
@@ -84,6 +88,13 @@ router.post('/upload-dataset', upload.single('dataset'), async (req, res) => {
         });
     });
 
+    // New data invalidates cached predictions in the ML service (best effort)
+    try {
+      await axios.post(`${ML_SERVICE_URL}/cache/invalidate`, {}, { timeout: 2000 });
+    } catch (error) {
+      console.warn('⚠️ Could not invalidate ML service cache:', error.message);
+    }
+
     res.json({
       success: true,
       message: 'Dataset uploaded successfully',
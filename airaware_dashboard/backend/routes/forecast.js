@@ -8,9 +8,65 @@ const csv = require('csv-parser');
 let forecastData = null;
 let pollutantTrendsData = null;
 
+// Per-city shards written by the generators: <dir>/manifest.json maps each
+// city to a small JSON file, so a request reads only that city's file.
+const ML_SERVICE_DIR = path.join(__dirname, '../../ml_service');
+const shardCache = {};
+
+const findShardDir = (name) => {
+  const candidates = [
+    path.join(__dirname, '../data', name),
+    path.join(ML_SERVICE_DIR, name)
+  ];
+  return candidates.find(dir => fs.existsSync(path.join(dir, 'manifest.json'))) || null;
+};
+
+// Returns the manifest for a shard directory, re-reading it only when it changes
+const loadManifest = (name) => {
+  const dir = findShardDir(name);
+  if (!dir) return null;
+
+  const manifestPath = path.join(dir, 'manifest.json');
+  const mtime = fs.statSync(manifestPath).mtimeMs;
+  const cached = shardCache[name];
+  if (cached && cached.dir === dir && cached.mtime === mtime) {
+    return cached;
+  }
+
+  const manifest = JSON.parse(fs.readFileSync(manifestPath, 'utf8'));
+  if (manifest.format !== 'json') {
+    console.warn(`⚠️ ${name} shards are ${manifest.format}; falling back to the single JSON file`);
+    return null;
+  }
+  shardCache[name] = { dir, mtime, manifest };
+  return shardCache[name];
+};
+
+// Read one city's shard (null if there is no sharded output for it)
+const readCityShard = (name, city) => {
+  try {
+    const entry = loadManifest(name);
+    if (!entry || !entry.manifest.cities[city]) return null;
+    const shardPath = path.join(entry.dir, entry.manifest.cities[city].file);
+    return JSON.parse(fs.readFileSync(shardPath, 'utf8'));
+  } catch (error) {
+    console.error(`❌ Error reading ${name} shard for ${city}:`, error.message);
+    return null;
+  }
+};
+
+const shardCities = (name) => {
+  try {
+    const entry = loadManifest(name);
+    return entry ? Object.keys(entry.manifest.cities) : null;
+  } catch (error) {
+    return null;
+  }
+};
+
 const loadForecastData = () => {
   try {
-    const forecastPath = path.join(__dirname, '../../ml_service/precomputed-forecasts.json');
+    const forecastPath = path.join(ML_SERVICE_DIR, 'precomputed-forecasts.json');
     const data = fs.readFileSync(forecastPath, 'utf8');
     forecastData = JSON.parse(data);
     console.log('✅ Loaded pre-computed forecasts for', Object.keys(forecastData).length, 'cities');
@@ -25,7 +81,7 @@ const loadForecastData = () => {
     
     // If not in backend/data, try ml_service
     if (!fs.existsSync(trendsPath)) {
-      trendsPath = path.join(__dirname, '../../ml_service/precomputed-pollutant-trends.json');
+      trendsPath = path.join(ML_SERVICE_DIR, 'precomputed-pollutant-trends.json');
     }
     
     const data = fs.readFileSync(trendsPath, 'utf8');
@@ -38,7 +94,7 @@ const loadForecastData = () => {
   }
 };
 
-// Load forecasts on startup
+// Load forecasts on startup (single-file fallback when shards are missing)
 loadForecastData();
 
 // Helper function to read CSV files
@@ -318,17 +374,25 @@ async function predictWithXGBoost(city, days = 7) {
     }
 
     const predictions = predictionResponse.data.predictions;
+    const intervals = predictionResponse.data.prediction_intervals;
+    const clamp = (aqi) => Math.round(Math.max(0, Math.min(500, aqi)) * 10) / 10;
     
     // Format predictions for frontend
     const forecast = predictions.map((aqi, index) => {
       const forecastDate = new Date(today);
       forecastDate.setDate(today.getDate() + index + 1);
       
-      return {
+      const day = {
         date: formatDate(forecastDate),
         day: getDayName(forecastDate).substring(0, 3),
-        aqi: Math.round(Math.max(0, Math.min(500, aqi)) * 10) / 10 // Clamp and round
+        aqi: clamp(aqi) // Clamp and round
       };
+      // Quantile model: 80% prediction interval from the same inference pass
+      if (intervals) {
+        day.lower = clamp(intervals.lower[index]);
+        day.upper = clamp(intervals.upper[index]);
+      }
+      return day;
     });
 
     console.log(`✅ XGBoost predictions generated for ${city}:`, forecast);
@@ -385,6 +449,17 @@ async function fallbackPrediction(city, days = 7) {
   return predictions;
 }
 
+// { lower, upper } arrays when the forecast days carry interval bounds
+function intervalsFromForecast(forecast) {
+  if (!forecast.length || forecast.some(day => day.lower === undefined || day.upper === undefined)) {
+    return null;
+  }
+  return {
+    lower: forecast.map(day => day.lower),
+    upper: forecast.map(day => day.upper)
+  };
+}
+
 // GET /api/forecast/7-day?city=Delhi
 router.get('/7-day', async (req, res) => {
   try {
@@ -399,14 +474,15 @@ router.get('/7-day', async (req, res) => {
 
     console.log(`🔮 Fetching pre-computed forecast for ${city}...`);
     
-    // Get forecast from pre-computed data
-    const forecast = forecastData[city];
+    // Get forecast from the city's shard, or the single pre-computed file
+    const forecast = readCityShard('precomputed-forecasts', city) || forecastData[city];
 
     if (!forecast) {
-      console.log(`⚠️ No forecast found for ${city}, available cities:`, Object.keys(forecastData));
+      const availableCities = shardCities('precomputed-forecasts') || Object.keys(forecastData);
+      console.log(`⚠️ No forecast found for ${city}, available cities:`, availableCities);
       return res.status(404).json({
         success: false,
-        error: `No forecast available for ${city}. Available cities: ${Object.keys(forecastData).join(', ')}`
+        error: `No forecast available for ${city}. Available cities: ${availableCities.join(', ')}`
       });
     }
 
@@ -416,6 +492,7 @@ router.get('/7-day', async (req, res) => {
       success: true,
       city: city,
       forecast: forecast,
+      prediction_intervals: intervalsFromForecast(forecast),
       model: 'XGBoost (Pre-computed)',
       generated: new Date().toISOString()
     });
@@ -434,6 +511,22 @@ router.get('/pollutant-trends', (req, res) => {
   try {
     const { city } = req.query;
 
+    // Single-city requests only need that city's shard
+    const cityShard = city ? readCityShard('precomputed-pollutant-trends', city) : null;
+    if (cityShard) {
+      return res.json({
+        success: true,
+        city: city,
+        trends: cityShard.trends,
+        metadata: {
+          ...cityShard.metadata,
+          trainedOn: cityShard.trainedOn,
+          forecastDays: cityShard.forecastDays,
+          pollutants: cityShard.pollutants
+        }
+      });
+    }
+
     if (!pollutantTrendsData || !pollutantTrendsData.forecasts) {
       return res.status(503).json({
         success: false,
@@ -483,4 +576,22 @@ router.get('/pollutant-trends', (req, res) => {
   }
 });
 
+// Active alerts, evaluated by the ML service as readings are ingested
+router.get('/alerts', async (req, res) => {
+  try {
+    const { city, severity } = req.query;
+    const response = await axios.get(`${ML_SERVICE_URL}/alerts`, {
+      params: { city, severity },
+      timeout: 5000
+    });
+    res.json(response.data);
+  } catch (error) {
+    console.error('❌ Alerts error:', error.message);
+    res.status(error.response ? error.response.status : 503).json({
+      success: false,
+      error: error.response?.data?.detail || 'Alert service not available'
+    });
+  }
+});
+
 module.exports = router;
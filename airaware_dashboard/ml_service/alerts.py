@@ -0,0 +1,258 @@
+"""
+Streaming alert evaluation for incoming hourly readings
+Every (city, pollutant) has a fixed-size ring buffer of its latest values
+with running sums, so each reading is checked against three kinds of rule
+in constant time:
+
+- threshold:      value above the CPCB warning / critical level
+- rate of change: rise since the earliest reading of the last `lookback`
+                  hours above a limit (by timestamp, so gaps are not bridged)
+- anomaly:        rolling z-score of the value against the buffer above a limit
+
+Alerts stay active (in memory) until a later reading clears the condition,
+or expire once the city's readings have moved WINDOW hours past them (so an
+alert clears when its pollutant stops reporting).
+Rules can be overridden per pollutant from a JSON file (ML_ALERT_RULES).
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from data_store import VALUE_COLUMNS
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+WINDOW = 24
+MIN_ZSCORE_SAMPLES = 12
+
+# CPCB levels: warning at the 24h NAAQS limit ("Moderate"), critical at the
+# start of the "Very Poor" sub-index band. CO in mg/m³, the rest in µg/m³.
+DEFAULT_RULES = {
+    'PM2.5': {'warning': 60, 'critical': 121, 'rise': 60, 'zscore': 3.0},
+    'PM10': {'warning': 100, 'critical': 351, 'rise': 100, 'zscore': 3.0},
+    'NO2': {'warning': 80, 'critical': 281, 'rise': 80, 'zscore': 3.0},
+    'SO2': {'warning': 80, 'critical': 801, 'rise': 80, 'zscore': 3.0},
+    'CO': {'warning': 2, 'critical': 17, 'rise': 4, 'zscore': 3.0},
+    'O3': {'warning': 100, 'critical': 209, 'rise': 60, 'zscore': 3.0},
+    'NH3': {'warning': 400, 'critical': 1201, 'rise': 200, 'zscore': 3.0},
+    'AQI': {'warning': 200, 'critical': 300, 'rise': 50, 'zscore': 3.0},
+}
+DEFAULT_LOOKBACK = 3
+
+SEVERITY_ORDER = {'critical': 2, 'warning': 1}
+
+
+def load_rules(path: Optional[str] = None) -> Dict[str, Dict]:
+    """DEFAULT_RULES with per-pollutant overrides from a JSON file"""
+    rules = {col: dict(rule, lookback=DEFAULT_LOOKBACK) for col, rule in DEFAULT_RULES.items()}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for col, override in json.load(f).items():
+                if override is None:
+                    rules.pop(col, None)
+                else:
+                    rules.setdefault(col, {'lookback': DEFAULT_LOOKBACK}).update(override)
+    for col, rule in rules.items():
+        if not 1 <= int(rule.get('lookback', DEFAULT_LOOKBACK)) < WINDOW:
+            raise ValueError(f"Alert lookback for {col} must be between 1 and {WINDOW - 1}")
+    return rules
+
+
+class RingBuffer:
+    """Last `size` values (and their times) with running sum and sum of squares"""
+
+    __slots__ = ('values', 'times', 'size', 'count', 'head', 'total', 'total_sq')
+
+    def __init__(self, size: int = WINDOW):
+        self.values = np.zeros(size)
+        self.times: List[Optional[datetime]] = [None] * size
+        self.size = size
+        self.count = 0
+        self.head = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def push(self, value: float, when: datetime):
+        if self.count == self.size:
+            old = self.values[self.head]
+            self.total -= old
+            self.total_sq -= old * old
+        else:
+            self.count += 1
+        self.values[self.head] = value
+        self.times[self.head] = when
+        self.total += value
+        self.total_sq += value * value
+        self.head = (self.head + 1) % self.size
+
+    def earliest_since(self, cutoff: datetime) -> Optional[Tuple[datetime, float]]:
+        """(time, value) of the oldest reading at or after cutoff, excluding the latest"""
+        found = None
+        for steps in range(1, self.count):
+            i = (self.head - 1 - steps) % self.size
+            if self.times[i] < cutoff:
+                break
+            found = (self.times[i], float(self.values[i]))
+        return found
+
+    def mean_std(self) -> Tuple[float, float]:
+        mean = self.total / self.count
+        variance = max(self.total_sq / self.count - mean * mean, 0.0)
+        return mean, variance ** 0.5
+
+
+class AlertEngine:
+    """Ring buffers and active alerts per (city, pollutant)"""
+
+    def __init__(self, rules: Dict[str, Dict] = None):
+        self.rules = rules if rules is not None else load_rules()
+        self.columns = [(VALUE_COLUMNS.index(col), col) for col in self.rules if col in VALUE_COLUMNS]
+        self.buffers: Dict[Tuple[str, str], RingBuffer] = {}
+        # Per city: (pollutant, kind) -> alert, and when each was last confirmed
+        self.active: Dict[str, Dict[Tuple[str, str], Dict]] = {}
+        self.confirmed: Dict[str, Dict[Tuple[str, str], datetime]] = {}
+        self.latest: Dict[str, datetime] = {}
+        self.evaluated = 0
+
+    @classmethod
+    def from_frame(cls, df: "pd.DataFrame", rules: Dict[str, Dict] = None) -> "AlertEngine":
+        """Warm the buffers with each city's latest WINDOW readings
+
+        Warm-up readings are history: they fill the buffers but raise no alerts.
+        """
+        engine = cls(rules)
+        if df is None or df.empty:
+            return engine
+        tail = df.groupby('City', sort=False).tail(WINDOW)
+        columns = [col for col in VALUE_COLUMNS if col in tail.columns]
+        idx = [VALUE_COLUMNS.index(col) for col in columns]
+        values = np.full((len(tail), len(VALUE_COLUMNS)), np.nan)
+        values[:, idx] = tail[columns].to_numpy(dtype=float)
+        for city, when, row in zip(tail['City'], tail['Datetime'].dt.to_pydatetime(), values):
+            engine.observe(city, when, row, record=False)
+        return engine
+
+    def observe(self, city: str, when: datetime, values: np.ndarray, record: bool = True) -> List[Dict]:
+        """Evaluate one reading (VALUE_COLUMNS order, NaN = missing)
+
+        Returns the alerts raised or updated by this reading. With
+        record=False the reading only goes into the buffers.
+        """
+        if city not in self.latest or when > self.latest[city]:
+            self.latest[city] = when
+        active = self.active.setdefault(city, {})
+        confirmed = self.confirmed.setdefault(city, {})
+        raised = []
+        for i, col in self.columns:
+            value = values[i]
+            if np.isnan(value):
+                continue
+            rule = self.rules[col]
+            buffer = self.buffers.get((city, col))
+            if buffer is None:
+                buffer = self.buffers[(city, col)] = RingBuffer()
+
+            # Z-score against the window before this reading
+            zscore = None
+            if buffer.count >= MIN_ZSCORE_SAMPLES:
+                mean, std = buffer.mean_std()
+                if std > 0:
+                    zscore = (value - mean) / std
+            buffer.push(float(value), when)
+            if not record:
+                continue
+            previous = buffer.earliest_since(when - timedelta(hours=int(rule['lookback'])))
+
+            checks = {
+                'threshold': self._threshold(col, value, rule),
+                'rate_of_change': self._rise(col, value, when, previous, rule),
+                'anomaly': self._anomaly(col, value, zscore, rule),
+            }
+            for kind, alert in checks.items():
+                key = (col, kind)
+                if alert is None:
+                    active.pop(key, None)
+                    confirmed.pop(key, None)
+                    continue
+                alert.update(city=city, pollutant=col, kind=kind, value=round(float(value), 2),
+                             datetime=when.isoformat())
+                existing = active.get(key)
+                alert['since'] = existing['since'] if existing else alert['datetime']
+                active[key] = alert
+                confirmed[key] = when
+                raised.append(alert)
+        if record:
+            self.evaluated += 1
+        self._expire(city)
+        return raised
+
+    def _expire(self, city: str):
+        """Drop the city's alerts last confirmed more than WINDOW hours ago
+
+        Only this city's alerts are looked at (at most one per rule and kind).
+        """
+        cutoff = self.latest[city] - timedelta(hours=WINDOW)
+        confirmed = self.confirmed[city]
+        for key in [key for key, when in confirmed.items() if when < cutoff]:
+            del confirmed[key]
+            del self.active[city][key]
+
+    @staticmethod
+    def _threshold(col: str, value: float, rule: Dict) -> Optional[Dict]:
+        for severity in ('critical', 'warning'):
+            limit = rule.get(severity)
+            if limit is not None and value > limit:
+                return {
+                    'severity': severity,
+                    'limit': limit,
+                    'message': f"{col} {value:.1f} above CPCB {severity} level {limit}",
+                }
+        return None
+
+    @staticmethod
+    def _rise(col: str, value: float, when: datetime, previous: Optional[Tuple[datetime, float]],
+              rule: Dict) -> Optional[Dict]:
+        limit = rule.get('rise')
+        if limit is None or previous is None or value - previous[1] <= limit:
+            return None
+        hours = (when - previous[0]).total_seconds() / 3600
+        return {
+            'severity': 'warning',
+            'limit': limit,
+            'message': f"{col} rose {value - previous[1]:.1f} in {hours:g}h (from {previous[1]:.1f})",
+        }
+
+    @staticmethod
+    def _anomaly(col: str, value: float, zscore: Optional[float], rule: Dict) -> Optional[Dict]:
+        limit = rule.get('zscore')
+        if limit is None or zscore is None or abs(zscore) <= limit:
+            return None
+        return {
+            'severity': 'warning',
+            'limit': limit,
+            'zscore': round(float(zscore), 2),
+            'message': f"{col} {value:.1f} is {zscore:+.1f}σ from its {WINDOW}h mean",
+        }
+
+    def active_alerts(self, city: Optional[str] = None, severity: Optional[str] = None) -> List[Dict]:
+        """Active alerts, most severe and most recent first"""
+        minimum = SEVERITY_ORDER.get(severity, 0)
+        cities = [city] if city is not None else list(self.active)
+        alerts = [
+            alert for name in cities for alert in self.active.get(name, {}).values()
+            if SEVERITY_ORDER[alert['severity']] >= minimum
+        ]
+        return sorted(alerts, key=lambda a: (SEVERITY_ORDER[a['severity']], a['datetime']), reverse=True)
+
+    def stats(self) -> Dict:
+        return {
+            "readings_evaluated": self.evaluated,
+            "buffers": len(self.buffers),
+            "active": sum(len(alerts) for alerts in self.active.values()),
+            "window": WINDOW,
+        }
@@ -0,0 +1,103 @@
+"""
+Atomic, per-city sharded output for precomputed forecast artifacts
+Each generator writes one small file per city plus a manifest.json that maps
+city -> shard file, so a reader needs the manifest and a single shard
+instead of parsing one large file. Every file is written to a temporary
+file in the same directory and renamed into place, so readers never see a
+partially written file. The manifest is written last.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+from datetime import datetime
+from typing import Any, Dict
+
+FORMATS = ('json', 'msgpack')
+MANIFEST_NAME = 'manifest.json'
+
+# mkstemp creates files as 0600; published files are world-readable. A fixed
+# mode avoids reading the umask, which can only be done by changing it.
+FILE_MODE = 0o644
+
+
+def write_atomic(path: str, data: bytes):
+    """Write bytes to path via a temp file + rename"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, FILE_MODE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def encode(obj: Any, fmt: str = 'json') -> bytes:
+    """Compact JSON, or MessagePack (requires the msgpack package)"""
+    if fmt == 'msgpack':
+        import msgpack
+        return msgpack.packb(obj, use_bin_type=True)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def write_json_atomic(path: str, obj: Any):
+    write_atomic(path, encode(obj, 'json'))
+
+
+def shard_filename(city: str, fmt: str = 'json') -> str:
+    """Filesystem-safe shard name for a city
+
+    Names that had to be rewritten get a short hash of the original, so
+    e.g. "Navi Mumbai" and "Navi-Mumbai" do not share a file.
+    """
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '_', city).strip('_') or 'city'
+    if slug != city:
+        slug = f"{slug}_{hashlib.sha1(city.encode('utf-8')).hexdigest()[:8]}"
+    return f"{slug}.{fmt}"
+
+
+def write_sharded(directory: str, shards: Dict[str, Any], fmt: str = 'json', metadata: Dict = None) -> Dict:
+    """Write one file per city and then the manifest; returns the manifest"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt} (expected one of {', '.join(FORMATS)})")
+
+    cities = {}
+    owners: Dict[str, str] = {}
+    for city, payload in shards.items():
+        filename = shard_filename(city, fmt)
+        # Compared case-insensitively, as the shards may sit on such a filesystem
+        if filename.lower() in owners:
+            stem, ext = os.path.splitext(filename)
+            filename = f"{stem}_{hashlib.sha1(city.encode('utf-8')).hexdigest()[:8]}{ext}"
+        clash = owners.setdefault(filename.lower(), city)
+        if clash != city:
+            raise ValueError(f"Cities {clash!r} and {city!r} map to the same shard file {filename}")
+        data = encode(payload, fmt)
+        write_atomic(os.path.join(directory, filename), data)
+        cities[city] = {'file': filename, 'bytes': len(data)}
+
+    manifest = {
+        'format': fmt,
+        'generatedAt': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'totalCities': len(cities),
+        'cities': cities,
+        'metadata': metadata or {},
+    }
+    write_json_atomic(os.path.join(directory, MANIFEST_NAME), manifest)
+
+    # Shards of cities that are no longer generated go only after the new
+    # manifest is in place, so a reader never follows a stale entry
+    current = {entry['file'] for entry in cities.values()}
+    for name in os.listdir(directory):
+        if name.endswith(tuple('.' + f for f in FORMATS)) and name != MANIFEST_NAME and name not in current:
+            os.unlink(os.path.join(directory, name))
+    return manifest
@@ -0,0 +1,209 @@
+"""
+Mergeable co-moment accumulators for pollutant correlation matrices
+For every (city, day) and (city, month) bucket we keep, per pollutant pair,
+the number of rows where both values are present, the means and second
+moments over those rows, and the co-moment. Accumulators combine with the
+pairwise (Chan/Welford) update, so the correlation matrix for any city and
+date range is obtained by merging whole months plus edge days, and new
+readings are folded in with add_rows().
+"""
+
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from data_store import POLLUTANTS
+from rollups import day_to_month, split_range
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class CoMoments:
+    """Pairwise co-moments for P columns
+
+    n[i, j]    rows where columns i and j are both present
+    mean[i, j] mean of column i over those rows
+    m2[i, j]   sum of squared deviations of column i over those rows
+    c[i, j]    co-moment of columns i and j (symmetric)
+    Arrays may carry a leading bucket dimension.
+    """
+
+    __slots__ = ('n', 'mean', 'm2', 'c')
+
+    def __init__(self, n, mean, m2, c):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+        self.c = c
+
+    @classmethod
+    def empty(cls, n_columns: int) -> "CoMoments":
+        shape = (n_columns, n_columns)
+        return cls(np.zeros(shape), np.zeros(shape), np.zeros(shape), np.zeros(shape))
+
+    @staticmethod
+    def combine(a_n, a_mean, a_m2, a_c, b_n, b_mean, b_m2, b_c):
+        """Pairwise parallel update; works on single or stacked buckets"""
+        n = a_n + b_n
+        safe_n = np.where(n > 0, n, 1.0)
+        delta = b_mean - a_mean
+        weight = a_n * b_n / safe_n
+        mean = a_mean + delta * (b_n / safe_n)
+        m2 = a_m2 + b_m2 + delta * delta * weight
+        c = a_c + b_c + delta * np.swapaxes(delta, -1, -2) * weight
+        return n, mean, m2, c
+
+    def merge(self, other: "CoMoments"):
+        self.n, self.mean, self.m2, self.c = self.combine(
+            self.n, self.mean, self.m2, self.c, other.n, other.mean, other.m2, other.c)
+
+    def correlation(self, min_count: int = 3) -> np.ndarray:
+        """Pearson correlation matrix (NaN where fewer than min_count pairs)"""
+        denominator = np.sqrt(self.m2 * self.m2.T)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r = self.c / denominator
+        r[(self.n < min_count) | (denominator <= 0)] = np.nan
+        return np.clip(r, -1.0, 1.0)
+
+
+def comoments_sorted(keys: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, CoMoments]:
+    """Co-moments per distinct key for rows sorted by key (NaN = missing)"""
+    unique_keys, starts = np.unique(keys, return_index=True)
+    present = ~np.isnan(values)
+    mask = present.astype(float)
+    x = np.where(present, values, 0.0)
+
+    # Per-bucket sums over rows where both columns are present
+    n = np.add.reduceat(np.einsum('ri,rj->rij', mask, mask), starts, axis=0)
+    s = np.add.reduceat(np.einsum('ri,rj->rij', x, mask), starts, axis=0)
+    q = np.add.reduceat(np.einsum('ri,rj->rij', x * x, mask), starts, axis=0)
+    p = np.add.reduceat(np.einsum('ri,rj->rij', x, x), starts, axis=0)
+
+    safe_n = np.where(n > 0, n, 1.0)
+    mean = s / safe_n
+    m2 = np.maximum(q - s * mean, 0.0)
+    c = p - s * np.swapaxes(s, -1, -2) / safe_n
+    return unique_keys, CoMoments(n, mean, m2, c)
+
+
+def coarsen_comoments(keys: np.ndarray, buckets: CoMoments, coarse_keys: np.ndarray) -> Tuple[np.ndarray, CoMoments]:
+    """Merge sorted buckets into coarser buckets (e.g. days into months)"""
+    unique_keys, inverse = np.unique(coarse_keys, return_inverse=True)
+    n_columns = buckets.n.shape[-1]
+    out = CoMoments(*(np.zeros((len(unique_keys), n_columns, n_columns)) for _ in range(4)))
+    for i in range(len(keys)):
+        g = inverse[i]
+        out.n[g], out.mean[g], out.m2[g], out.c[g] = CoMoments.combine(
+            out.n[g], out.mean[g], out.m2[g], out.c[g],
+            buckets.n[i], buckets.mean[i], buckets.m2[i], buckets.c[i])
+    return unique_keys, out
+
+
+class CoMomentLevel:
+    """Sorted co-moment buckets of one granularity for one city"""
+
+    def __init__(self, n_columns: int):
+        self.keys = np.empty(0, dtype=np.int64)
+        self.buckets = CoMoments(*(np.zeros((0, n_columns, n_columns)) for _ in range(4)))
+
+    def merge(self, keys: np.ndarray, partial: CoMoments):
+        pos = np.searchsorted(self.keys, keys)
+        hit = pos < len(self.keys)
+        hit[hit] = self.keys[pos[hit]] == keys[hit]
+
+        if hit.any():
+            idx = pos[hit]
+            b = self.buckets
+            b.n[idx], b.mean[idx], b.m2[idx], b.c[idx] = CoMoments.combine(
+                b.n[idx], b.mean[idx], b.m2[idx], b.c[idx],
+                partial.n[hit], partial.mean[hit], partial.m2[hit], partial.c[hit])
+
+        new = ~hit
+        if new.any():
+            all_keys = np.concatenate([self.keys, keys[new]])
+            order = np.argsort(all_keys, kind='mergesort')
+            self.keys = all_keys[order]
+            for name in CoMoments.__slots__:
+                merged = np.concatenate([getattr(self.buckets, name), getattr(partial, name)[new]])
+                setattr(self.buckets, name, merged[order])
+
+    def select(self, first_key: int, last_key: int, into: CoMoments) -> int:
+        """Merge buckets with first_key <= key <= last_key into `into`"""
+        lo = np.searchsorted(self.keys, first_key, side='left')
+        hi = np.searchsorted(self.keys, last_key, side='right')
+        b = self.buckets
+        for i in range(lo, hi):
+            into.n, into.mean, into.m2, into.c = CoMoments.combine(
+                into.n, into.mean, into.m2, into.c, b.n[i], b.mean[i], b.m2[i], b.c[i])
+        return int(max(hi - lo, 0))
+
+
+class CorrelationStore:
+    """Daily and monthly co-moment accumulators per city"""
+
+    def __init__(self, columns: List[str] = None):
+        self.columns = list(columns or POLLUTANTS)
+        self.days: Dict[str, CoMomentLevel] = {}
+        self.months: Dict[str, CoMomentLevel] = {}
+
+    @classmethod
+    def from_frame(cls, df: "pd.DataFrame") -> "CorrelationStore":
+        store = cls([col for col in POLLUTANTS if col in df.columns])
+        store.add_rows(df)
+        return store
+
+    def add_rows(self, df: "pd.DataFrame"):
+        """Fold hourly rows (City, Datetime, pollutant columns) into the accumulators"""
+        if df is None or df.empty:
+            return
+        import pandas as pd
+
+        day_keys = pd.to_datetime(df['Datetime']).to_numpy().astype('datetime64[D]').astype(np.int64)
+        values = np.column_stack([
+            pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float) if col in df.columns
+            else np.full(len(df), np.nan)
+            for col in self.columns
+        ])
+        cities = df['City'].to_numpy()
+
+        for city in pd.unique(cities):
+            rows = np.flatnonzero(cities == city)
+            order = rows[np.argsort(day_keys[rows], kind='mergesort')]
+            keys, daily = comoments_sorted(day_keys[order], values[order])
+            month_keys, monthly = coarsen_comoments(keys, daily, day_to_month(keys))
+
+            self.days.setdefault(city, CoMomentLevel(len(self.columns))).merge(keys, daily)
+            self.months.setdefault(city, CoMomentLevel(len(self.columns))).merge(month_keys, monthly)
+
+    @property
+    def cities(self) -> List[str]:
+        return sorted(self.days)
+
+    def query(self, city: Optional[str] = None, first_day: Optional[int] = None,
+              last_day: Optional[int] = None) -> Tuple[CoMoments, int]:
+        """Merged co-moments for a city (or all cities) over an inclusive day range"""
+        cities = [city] if city is not None else self.cities
+        months, edges = split_range(first_day, last_day)
+        result = CoMoments.empty(len(self.columns))
+        merged = 0
+        for name in cities:
+            if name not in self.days:
+                continue
+            if months is not None:
+                merged += self.months[name].select(months[0], months[1], result)
+            for lo, hi in edges:
+                merged += self.days[name].select(lo, hi, result)
+        return result, merged
+
+    def correlation_matrix(self, city: Optional[str] = None, first_day: Optional[int] = None,
+                           last_day: Optional[int] = None, min_count: int = 3) -> Dict:
+        moments, merged = self.query(city, first_day, last_day)
+        r = moments.correlation(min_count)
+        return {
+            "city": city,
+            "pollutants": self.columns,
+            "matrix": [[None if np.isnan(v) else round(float(v), 4) for v in row] for row in r],
+            "pair_counts": moments.n.astype(int).tolist(),
+            "buckets_merged": merged,
+        }
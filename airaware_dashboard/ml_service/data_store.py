@@ -0,0 +1,53 @@
+"""
+Shared access to the hourly dataset (city_hour_final.csv)
+The dataset is read once per process (in the serve.py parent when running
+with forked workers) and reused by every store built on top of it.
+"""
+
+import os
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(DATA_DIR, "city_hour_final.csv")
+
+# All pollutants present in the CSV, plus the AQI target
+POLLUTANTS = ['PM2.5', 'PM10', 'NO', 'NO2', 'NOx', 'NH3', 'CO', 'SO2', 'O3', 'Benzene', 'Toluene', 'Xylene']
+VALUE_COLUMNS = POLLUTANTS + ['AQI']
+
+_dataset = None
+
+
+def load_dataset(path: str = None) -> Optional["pd.DataFrame"]:
+    """Read the hourly CSV sorted by City and Datetime (None if missing)"""
+    import pandas as pd
+
+    path = path or DATA_PATH
+    if not os.path.exists(path):
+        print(f"Dataset not found at {path}")
+        return None
+
+    df = pd.read_csv(path)
+    df['Datetime'] = pd.to_datetime(df['Datetime'])
+    df = df.dropna(subset=['City', 'Datetime'])
+    for col in VALUE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    df = df.sort_values(['City', 'Datetime'], kind='mergesort').reset_index(drop=True)
+    print(f"Loaded {len(df):,} records from {path}")
+    return df
+
+
+def get_dataset() -> Optional["pd.DataFrame"]:
+    """Process-wide dataset, loaded on first use"""
+    global _dataset
+    if _dataset is None:
+        _dataset = load_dataset()
+    return _dataset
+
+
+def value_columns(df: "pd.DataFrame") -> List[str]:
+    """VALUE_COLUMNS present in df"""
+    return [col for col in VALUE_COLUMNS if col in df.columns]
@@ -0,0 +1,239 @@
+"""
+Server-side downsampling of long hourly series for charts
+SeriesStore indexes the hourly dataset by (city, time) and keeps min/max
+pyramids at a few fixed resolutions (6 hours, 1 day, 1 week, 30 days). A
+request for a time range uses the raw rows when they are within a few times
+the requested point budget, and otherwise the coarsest pyramid level that
+still has at least as many points as the chart needs; the result is reduced
+with LTTB or min-max bucketing. The output fills the chart width, and work
+is bounded by the level size rather than the length of the range.
+"""
+
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from data_store import VALUE_COLUMNS
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+LEVEL_SECONDS = (6 * 3600, 86400, 7 * 86400, 30 * 86400)
+# A source is used when it has at most this many points per output point
+OVERSAMPLE = 4
+MAX_POINTS = 5000
+METHODS = ('lttb', 'minmax')
+
+
+def lttb(t: np.ndarray, v: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets; returns indices of the kept points"""
+    n = len(t)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = t.astype(float)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = n - 1
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_lo, next_hi = hi, (edges[i + 2] if i + 2 < len(edges) else n)
+        next_hi = max(next_hi, next_lo + 1)
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = v[next_lo:next_hi].mean()
+
+        area = np.abs((x[a] - avg_x) * (v[lo:hi] - v[a]) - (x[a] - x[lo:hi]) * (avg_y - v[a]))
+        a = lo + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def minmax(t: np.ndarray, v: np.ndarray, n_buckets: int) -> np.ndarray:
+    """Indices of the min and max point of each of n_buckets equal time spans"""
+    n = len(t)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+    span = max(int(t[-1] - t[0]), 1)
+    bucket = np.minimum(((t - t[0]) * n_buckets) // span, n_buckets - 1)
+    return _bucket_extremes(bucket, v)
+
+
+def _bucket_extremes(bucket: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """Indices of the min and max value per (sorted) bucket id, in time order"""
+    order = np.lexsort((v, bucket))
+    sorted_bucket = bucket[order]
+    first = np.flatnonzero(np.r_[True, sorted_bucket[1:] != sorted_bucket[:-1]])
+    last = np.r_[first[1:] - 1, len(order) - 1]
+    return np.unique(np.concatenate([order[first], order[last]]))
+
+
+class GrowableArray:
+    """1-D array with amortised O(1) appends (capacity doubles when full)
+
+    Starts as a view on existing data (e.g. a slice of the loaded dataset),
+    which is copied, never written to, on the first change.
+    """
+
+    __slots__ = ('data', 'size', 'owned')
+
+    def __init__(self, initial: np.ndarray):
+        self.data = initial
+        self.size = len(initial)
+        self.owned = False
+
+    def view(self) -> np.ndarray:
+        return self.data[:self.size]
+
+    def truncate(self, size: int):
+        self.size = min(size, self.size)
+
+    def extend(self, values: np.ndarray):
+        needed = self.size + len(values)
+        if needed > len(self.data) or not self.owned:
+            grown = np.empty(max(needed, 2 * len(self.data), 64), dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+            self.owned = True
+        self.data[self.size:needed] = values
+        self.size = needed
+
+
+class SeriesStore:
+    """Time-indexed hourly values per city with min/max pyramid levels
+
+    Per-city times and values, and the pyramid levels, are GrowableArrays,
+    so add_rows() costs O(new rows) rather than O(history).
+    """
+
+    def __init__(self, df: "pd.DataFrame", columns: List[str] = None):
+        """Index a dataset sorted by City and Datetime (as data_store loads it)"""
+        self.columns = [col for col in (columns or VALUE_COLUMNS) if col in df.columns]
+        self.times: Dict[str, GrowableArray] = {}
+        self.values: Dict[str, Dict[str, GrowableArray]] = {}
+        self.levels: Dict[Tuple[str, str], List[Tuple[int, GrowableArray, GrowableArray]]] = {}
+
+        times = df['Datetime'].to_numpy(dtype='datetime64[s]').astype(np.int64)
+        values = {col: df[col].to_numpy(dtype=float) for col in self.columns}
+        cities = df['City'].to_numpy()
+        boundaries = np.flatnonzero(cities[1:] != cities[:-1]) + 1
+        starts = np.r_[0, boundaries]
+        ends = np.r_[boundaries, len(cities)]
+        for s, e in (zip(starts, ends) if len(cities) else ()):
+            self.times[cities[s]] = GrowableArray(times[s:e])
+            self.values[cities[s]] = {col: GrowableArray(values[col][s:e]) for col in self.columns}
+
+    @property
+    def cities(self) -> List[str]:
+        return sorted(self.times)
+
+    def raw(self, city: str, column: str) -> Tuple[np.ndarray, np.ndarray]:
+        return self.times[city].view(), self.values[city][column].view()
+
+    def pyramid(self, city: str, column: str) -> List[Tuple[int, np.ndarray, np.ndarray]]:
+        """[(seconds, times, values)] min/max levels, built on first use"""
+        key = (city, column)
+        if key not in self.levels:
+            t, v = self.raw(city, column)
+            self.levels[key] = [(seconds, GrowableArray(t[:0]), GrowableArray(v[:0])) for seconds in LEVEL_SECONDS]
+            self._extend_levels(key, t, v)
+        return [(seconds, level_t.view(), level_v.view()) for seconds, level_t, level_v in self.levels[key]]
+
+    def _extend_levels(self, key: Tuple[str, str], t: np.ndarray, v: np.ndarray):
+        """Fold points newer than the levels in; only their last bucket is recomputed"""
+        present = ~np.isnan(v)
+        t, v = t[present], v[present]
+        if len(t) == 0:
+            return
+        for seconds, level_t, level_v in self.levels[key]:
+            # The level's extremes stand in for the raw points of the bucket
+            # the new points extend, so no raw rows are re-read
+            cut = int(np.searchsorted(level_t.view(), (t[0] // seconds) * seconds, side='left'))
+            merged_t = np.concatenate([level_t.view()[cut:], t])
+            merged_v = np.concatenate([level_v.view()[cut:], v])
+            idx = _bucket_extremes(merged_t // seconds, merged_v)
+            level_t.truncate(cut)
+            level_v.truncate(cut)
+            level_t.extend(merged_t[idx])
+            level_v.extend(merged_v[idx])
+
+    def add_rows(self, df: "pd.DataFrame") -> int:
+        """Append rows newer than each city's last time; returns rows added"""
+        if df is None or df.empty:
+            return 0
+        import pandas as pd
+
+        added = 0
+        for city, rows in df.groupby('City', sort=False):
+            rows = rows.sort_values('Datetime')
+            t = rows['Datetime'].to_numpy(dtype='datetime64[s]').astype(np.int64)
+            current = self.times.get(city)
+            keep = np.ones(len(t), dtype=bool) if current is None or current.size == 0 else t > current.view()[-1]
+            keep[1:] &= t[1:] != t[:-1]
+            if not keep.any():
+                continue
+            t = t[keep]
+            new = {
+                col: (pd.to_numeric(rows[col], errors='coerce').to_numpy(dtype=float)[keep]
+                      if col in rows.columns else np.full(len(t), np.nan))
+                for col in self.columns
+            }
+            if current is None:
+                self.times[city] = GrowableArray(t[:0])
+                self.values[city] = {col: GrowableArray(new[col][:0]) for col in self.columns}
+            self.times[city].extend(t)
+            for col in self.columns:
+                self.values[city][col].extend(new[col])
+                if (city, col) in self.levels:
+                    self._extend_levels((city, col), t, new[col])
+            added += len(t)
+        return added
+
+    def build_all(self):
+        """Precompute every pyramid (run before forking workers)"""
+        for city in self.times:
+            for column in self.columns:
+                self.pyramid(city, column)
+
+    def series(self, city: str, column: str, start: Optional[int] = None, end: Optional[int] = None,
+               width: int = 1000, method: str = 'lttb') -> Dict:
+        """Downsampled (times, values) for start <= time <= end (epoch seconds)"""
+        width = max(3, min(int(width), MAX_POINTS))
+        target = width if method == 'lttb' else 2 * width
+        budget = target * OVERSAMPLE
+        lo = -np.inf if start is None else start
+        hi = np.inf if end is None else end
+
+        t, v = self.raw(city, column)
+        i, j = np.searchsorted(t, lo, side='left'), np.searchsorted(t, hi, side='right')
+        raw_points = int(j - i)
+        source = 'raw'
+
+        if raw_points > budget:
+            # Coarsest level that still has enough points to fill the width;
+            # raw rows only when even the finest level is too sparse
+            for seconds, level_t, level_v in reversed(self.pyramid(city, column)):
+                a, b = np.searchsorted(level_t, lo, side='left'), np.searchsorted(level_t, hi, side='right')
+                if b - a >= target:
+                    t, v, i, j = level_t, level_v, a, b
+                    source = f'{seconds}s'
+                    break
+
+        t, v = t[i:j], v[i:j]
+        if source == 'raw':
+            present = ~np.isnan(v)
+            t, v = t[present], v[present]
+
+        if method == 'lttb':
+            idx = lttb(t, v, width)
+        else:
+            idx = minmax(t, v, width)
+
+        return {
+            "times": t[idx],
+            "values": v[idx],
+            "raw_points": raw_points,
+            "source": source,
+        }
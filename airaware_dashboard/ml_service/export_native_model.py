@@ -0,0 +1,47 @@
+"""
+Export the pickled XGBoost model to XGBoost's native format
+The ML service loads best_model_xgboost.ubj (or .json) straight into a Booster
+instead of unpickling the sklearn wrapper, so the model file does not depend
+on the sklearn / xgboost versions it was pickled with.
+
+Usage: python export_native_model.py [source.pkl] [--format ubj|json]
+"""
+
+import os
+import sys
+
+import joblib
+
+from model_service import MODEL_BASENAME
+
+
+def export_native_model(source_path: str, fmt: str = "ubj") -> str:
+    """Save the booster inside a pickled XGBRegressor as <basename>.<fmt>"""
+    model = joblib.load(source_path)
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+
+    # Keep feature names so requests can still be matched by column name
+    names = getattr(model, "feature_names_in_", None)
+    if names is not None and not booster.feature_names:
+        booster.feature_names = [str(n) for n in names]
+
+    target_path = os.path.join(os.path.dirname(os.path.abspath(source_path)), f"{MODEL_BASENAME}.{fmt}")
+    booster.save_model(target_path)
+    return target_path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export the XGBoost model to native format")
+    parser.add_argument("source", nargs="?", default=f"{MODEL_BASENAME}.pkl")
+    parser.add_argument("--format", choices=["ubj", "json"], default="ubj")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"❌ Model file not found: {args.source}")
+        sys.exit(1)
+
+    print(f"📦 Exporting {args.source} to native {args.format.upper()} format...")
+    path = export_native_model(args.source, args.format)
+    print(f"✅ Saved {path} ({os.path.getsize(path) / 1024:.1f} KB)")
@@ -0,0 +1,97 @@
+"""
+Feature definitions shared by the batch generators and the online service
+MODEL_FEATURES is the column order the XGBoost AQI model was trained with
+(see MileStone -2.ipynb): current pollutant readings, 24 hourly AQI lags,
+rolling AQI means, and calendar features.
+"""
+
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Sequence
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+POLLUTANT_FEATURES = ['PM2.5', 'NO', 'NO2', 'NOx', 'NH3', 'CO', 'SO2', 'O3', 'Benzene', 'Toluene']
+LAGS = 24
+ROLLING_WINDOWS = (3, 6, 12, 24)
+MODEL_FEATURES = (
+    POLLUTANT_FEATURES
+    + [f'lag_{i}' for i in range(1, LAGS + 1)]
+    + [f'roll_mean_{w}' for w in ROLLING_WINDOWS]
+    + ['hour', 'dayofweek', 'month']
+)
+
+
+def estimate_aqi_from_pm25(pm25):
+    """Calculate AQI from PM2.5 using CPCB breakpoints"""
+    if pm25 <= 30:
+        return (50 / 30) * pm25
+    elif pm25 <= 60:
+        return 50 + ((100 - 50) / (60 - 30)) * (pm25 - 30)
+    elif pm25 <= 90:
+        return 100 + ((200 - 100) / (90 - 60)) * (pm25 - 60)
+    elif pm25 <= 120:
+        return 200 + ((300 - 200) / (120 - 90)) * (pm25 - 90)
+    elif pm25 <= 250:
+        return 300 + ((400 - 300) / (250 - 120)) * (pm25 - 120)
+    else:
+        return 400 + ((500 - 400) / (380 - 250)) * (min(pm25, 380) - 250)
+
+
+def lag_features(history: Sequence[float]) -> Dict[str, float]:
+    """lag_i and roll_mean_w from hourly AQI values (oldest first, NaN = missing)
+
+    lag_i is the AQI i readings back (NaN if missing); roll_mean_w is the
+    mean of the AQI values present among the last w readings, NaN if none.
+    build_feature_frame computes the same thing over the dataset.
+    """
+    features = {}
+    n = len(history)
+    for i in range(1, LAGS + 1):
+        features[f'lag_{i}'] = float(history[n - i]) if n >= i else float('nan')
+    for w in ROLLING_WINDOWS:
+        window = [value for value in history[max(n - w, 0):] if value == value]
+        features[f'roll_mean_{w}'] = sum(window) / len(window) if window else float('nan')
+    return features
+
+
+def time_features(when: datetime) -> Dict[str, int]:
+    """Calendar features under both the model's and the Node backend's names"""
+    return {
+        'year': when.year,
+        'month': when.month,
+        'day': when.day,
+        'hour': when.hour,
+        'dayofweek': when.weekday(),
+        'day_of_week': when.weekday(),
+    }
+
+
+def build_feature_frame(df: "pd.DataFrame") -> "pd.DataFrame":
+    """Training rows for the AQI model from an hourly dataset
+
+    Same definitions as lag_features / time_features, computed per city:
+    lags and rolling means only look at earlier rows, including those without
+    AQI (which count as missing). Returns MODEL_FEATURES plus City, Datetime
+    and the AQI target; rows without AQI are dropped only at the end.
+    """
+    import pandas as pd
+
+    df = df.sort_values(['City', 'Datetime'])
+    aqi = df.groupby('City', sort=False)['AQI']
+    frame = {col: df[col] if col in df.columns else float('nan') for col in POLLUTANT_FEATURES}
+    for i in range(1, LAGS + 1):
+        frame[f'lag_{i}'] = aqi.shift(i)
+    previous = aqi.shift(1)
+    for w in ROLLING_WINDOWS:
+        frame[f'roll_mean_{w}'] = previous.groupby(df['City'], sort=False).transform(
+            lambda s, w=w: s.rolling(w, min_periods=1).mean())
+    frame['hour'] = df['Datetime'].dt.hour
+    frame['dayofweek'] = df['Datetime'].dt.dayofweek
+    frame['month'] = df['Datetime'].dt.month
+
+    out = pd.DataFrame(frame, index=df.index)[MODEL_FEATURES]
+    out.insert(0, 'Datetime', df['Datetime'])
+    out.insert(0, 'City', df['City'])
+    out['AQI'] = df['AQI']
+    return out[out['AQI'].notna()].reset_index(drop=True)
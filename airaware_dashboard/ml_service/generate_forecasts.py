@@ -1,133 +1,104 @@
+import argparse
+import os
 import pandas as pd
 import numpy as np
-import pickle
 from datetime import datetime, timedelta
-import json
+from artifacts import FORMATS, write_json_atomic, write_sharded
+from features import estimate_aqi_from_pm25
+from model_service import MODEL_BASENAME, NATIVE_MODEL_EXTENSIONS, QUANTILE_MODEL_BASENAME, MLModelService
+from online_state import OnlineStore
+from weekday_profiles import PROFILE_FILE, RECENT_WEEKS, WeekdayProfileStore
+
+parser = argparse.ArgumentParser(description="Generate day-of-week 7-day AQI forecasts")
+parser.add_argument('--format', choices=FORMATS, default='json',
+                    help="Shard format (msgpack requires the msgpack package)")
+args = parser.parse_args()
 
 print("📊 Loading data and XGBoost model...")
 
 # Load CSV data
 df = pd.read_csv('city_hour_final.csv')
 df['Datetime'] = pd.to_datetime(df['Datetime'])
+df = df.sort_values(['City', 'Datetime']).reset_index(drop=True)
 
-# Add day_of_week column (0=Monday, 6=Sunday)
-df['day_of_week'] = df['Datetime'].dt.dayofweek
-
-# Load XGBoost model
-try:
-    with open('best_model_xgboost.pkl', 'rb') as f:
-        model = pickle.load(f)
-    model_loaded = True
-    print("✅ XGBoost model loaded successfully")
-except Exception as e:
-    print(f"⚠️ Could not load XGBoost model: {e}")
+# Load XGBoost model: the tuned native model (tune_xgboost.py) when present,
+# otherwise the pickled one
+model_path = next((f'{MODEL_BASENAME}{ext}' for ext in NATIVE_MODEL_EXTENSIONS + ('.pkl',)
+                   if os.path.exists(f'{MODEL_BASENAME}{ext}')), f'{MODEL_BASENAME}.pkl')
+point_service = MLModelService(model_path)
+model_loaded = point_service.model is not None
+if model_loaded:
+    print(f"✅ XGBoost model loaded successfully ({model_path})")
+else:
+    print(f"⚠️ Could not load XGBoost model from {model_path}")
     print("⚠️ Will use day-of-week statistical forecasting instead")
-    model_loaded = False
+
+# Multi-quantile model (train_quantile_model.py): median and 80% interval in one pass
+quantile_service = None
+quantile_model_path = f'{QUANTILE_MODEL_BASENAME}.ubj'
+if os.path.exists(quantile_model_path):
+    quantile_service = MLModelService(quantile_model_path)
+    if quantile_service.quantiles:
+        print(f"✅ Quantile model loaded ({quantile_service.quantiles})")
+    else:
+        quantile_service = None
 
 print(f"✅ Loaded {len(df)} records from CSV")
 
+# Weekday profiles: saved between runs (and loaded by the ML service), only
+# rows past each city's watermark are added
+profiles = WeekdayProfileStore.load_or_new(PROFILE_FILE)
+added = profiles.add_rows(df)
+profiles.save(PROFILE_FILE)
+print(f"✅ Weekday profiles updated with {added:,} new rows ({PROFILE_FILE})")
+
+# Per-city AQI lag buffers seeded from each city's latest readings, so model
+# rows carry the same lag / rolling features as the online service builds
+online = OnlineStore.from_frame(df, profiles)
+
 # Get list of all cities
 cities = sorted(df['City'].unique())
 print(f"\n🌍 Found {len(cities)} cities")
 
-# Simple AQI estimation from PM2.5 (CPCB standards)
-def estimate_aqi_from_pm25(pm25):
-    """Calculate AQI from PM2.5 using CPCB breakpoints"""
-    if pm25 <= 30:
-        return (50 / 30) * pm25
-    elif pm25 <= 60:
-        return 50 + ((100 - 50) / (60 - 30)) * (pm25 - 30)
-    elif pm25 <= 90:
-        return 100 + ((200 - 100) / (90 - 60)) * (pm25 - 60)
-    elif pm25 <= 120:
-        return 200 + ((300 - 200) / (120 - 90)) * (pm25 - 90)
-    elif pm25 <= 250:
-        return 300 + ((400 - 300) / (250 - 120)) * (pm25 - 120)
-    else:
-        return 400 + ((500 - 400) / (380 - 250)) * (min(pm25, 380) - 250)
-
 # Function to get day-of-week specific predictions
-def predict_by_day_of_week(city_data, forecast_date, target_day_of_week):
+def predict_by_day_of_week(city, forecast_date, target_day_of_week):
     """
     Predict AQI based on historical data for the SAME day of week
     E.g., for Monday prediction, use only historical Monday data
+    Returns (aqi, sample count, (lower, upper) or None)
     """
-    # Filter data for the specific day of week
-    day_specific_data = city_data[city_data['day_of_week'] == target_day_of_week].copy()
-    
-    if len(day_specific_data) < 5:
-        # Fallback to all data if not enough day-specific data
-        day_specific_data = city_data
+    # Weekday profile: PM2.5 is 70% recent weeks + 30% all history, the other
+    # pollutants their historical weekday means (falls back to all days when
+    # the weekday has too little data)
+    pollutants, sample_count = profiles.weekday_inputs(city, target_day_of_week)
+    avg_pm25 = pollutants['PM2.5']
     
-    # Calculate average pollutants for this specific day of week
-    avg_pm25 = day_specific_data['PM2.5'].mean()
-    avg_pm10 = day_specific_data['PM10'].mean() if 'PM10' in day_specific_data.columns else 0
-    avg_no = day_specific_data['NO'].mean() if 'NO' in day_specific_data.columns else 0
-    avg_no2 = day_specific_data['NO2'].mean() if 'NO2' in day_specific_data.columns else 0
-    avg_nox = day_specific_data['NOx'].mean() if 'NOx' in day_specific_data.columns else 0
-    avg_nh3 = day_specific_data['NH3'].mean() if 'NH3' in day_specific_data.columns else 0
-    avg_co = day_specific_data['CO'].mean() if 'CO' in day_specific_data.columns else 0
-    avg_so2 = day_specific_data['SO2'].mean() if 'SO2' in day_specific_data.columns else 0
-    avg_o3 = day_specific_data['O3'].mean() if 'O3' in day_specific_data.columns else 0
-    avg_benzene = day_specific_data['Benzene'].mean() if 'Benzene' in day_specific_data.columns else 0
-    avg_toluene = day_specific_data['Toluene'].mean() if 'Toluene' in day_specific_data.columns else 0
-    avg_xylene = day_specific_data['Xylene'].mean() if 'Xylene' in day_specific_data.columns else 0
+    # Prepare features for XGBoost: pollutants, AQI lags and calendar (at noon)
+    features = online.cities[city].model_features(
+        forecast_date.replace(hour=12, minute=0, second=0, microsecond=0),
+        {col: value for col, value in pollutants.items() if col != 'AQI'})
     
-    # Also get recent trend (last 3 months) for this day of week
-    recent_day_data = day_specific_data.sort_values('Datetime', ascending=False).head(12)  # Last ~3 months of this day
-    
-    if len(recent_day_data) > 0:
-        recent_weight = 0.7  # Give 70% weight to recent trend
-        historical_weight = 0.3  # 30% to historical average
-        
-        recent_pm25 = recent_day_data['PM2.5'].mean()
-        avg_pm25 = recent_pm25 * recent_weight + avg_pm25 * historical_weight
-    
-    # Prepare features for XGBoost
-    features = {
-        'year': forecast_date.year,
-        'month': forecast_date.month,
-        'day': forecast_date.day,
-        'hour': 12,
-        'day_of_week': target_day_of_week,
-        'PM2.5': avg_pm25,
-        'PM10': avg_pm10,
-        'NO': avg_no,
-        'NO2': avg_no2,
-        'NOx': avg_nox,
-        'NH3': avg_nh3,
-        'CO': avg_co,
-        'SO2': avg_so2,
-        'O3': avg_o3,
-        'Benzene': avg_benzene,
-        'Toluene': avg_toluene,
-        'Xylene': avg_xylene
-    }
+    if quantile_service is not None:
+        result = quantile_service.predict_records([features])
+        if 'error' not in result:
+            clamp = lambda aqi: max(0, min(500, aqi))
+            intervals = result['prediction_intervals']
+            interval = (clamp(intervals['lower'][0]), clamp(intervals['upper'][0]))
+            return clamp(result['predictions'][0]), sample_count, interval
+        print(f"  ⚠️ Quantile prediction failed: {result['error']}")
     
     if model_loaded:
-        try:
-            # Create feature array
-            feature_cols = ['year', 'month', 'day', 'hour', 'day_of_week', 
-                           'PM2.5', 'PM10', 'NO', 'NO2', 'NOx', 'NH3', 
-                           'CO', 'SO2', 'O3', 'Benzene', 'Toluene', 'Xylene']
-            
-            # Check if model has feature_names_in_ attribute
-            if hasattr(model, 'feature_names_in_'):
-                feature_cols = [col for col in model.feature_names_in_ if col in features]
-            
-            feature_array = np.array([[features[col] for col in feature_cols]])
-            
-            # Predict using XGBoost
-            predicted_aqi = model.predict(feature_array)[0]
+        result = point_service.predict_records([features])
+        if 'error' not in result:
+            predicted_aqi = float(result['predictions'][0])
             
             # Add small realistic variation (±3%)
             variation = (np.random.random() - 0.5) * 0.06
             predicted_aqi = predicted_aqi * (1 + variation)
             
             predicted_aqi = max(0, min(500, predicted_aqi))
-            
-        except Exception as e:
-            print(f"  ⚠️ XGBoost prediction failed, using statistical method: {e}")
+        else:
+            print(f"  ⚠️ XGBoost prediction failed, using statistical method: {result['error']}")
             # Fallback to statistical AQI calculation
             predicted_aqi = estimate_aqi_from_pm25(avg_pm25)
     else:
@@ -137,7 +108,7 @@ def predict_by_day_of_week(city_data, forecast_date, target_day_of_week):
         variation = (np.random.random() - 0.5) * 0.06
         predicted_aqi = predicted_aqi * (1 + variation)
     
-    return predicted_aqi, len(day_specific_data)
+    return predicted_aqi, sample_count, None
 
 # Generate forecasts for all cities
 forecasts = {}
@@ -147,11 +118,11 @@ today = datetime.now()
 for city in cities:
     print(f"\n🔮 Generating day-of-week specific forecast for {city}...")
     
-    # Get city data
-    city_data = df[df['City'] == city].copy()
+    # Readings recorded for the city (any column present)
+    city_records = int(profiles.profile(city)['historical_count'].max())
     
-    if len(city_data) < 10:
-        print(f"⚠️ Skipping {city} - insufficient data ({len(city_data)} records)")
+    if city_records < 10:
+        print(f"⚠️ Skipping {city} - insufficient data ({city_records} records)")
         continue
     
     # Generate predictions for next 7 days
@@ -163,14 +134,18 @@ for city in cities:
         target_day_of_week = forecast_date.weekday()  # 0=Monday, 6=Sunday
         
         # Get prediction based on historical data for this specific day of week
-        predicted_aqi, sample_count = predict_by_day_of_week(city_data, forecast_date, target_day_of_week)
+        predicted_aqi, sample_count, interval = predict_by_day_of_week(city, forecast_date, target_day_of_week)
         
         # Format prediction
-        city_forecast.append({
+        day_forecast = {
             'date': forecast_date.strftime('%b %d'),
             'day': day_names[target_day_of_week],
             'aqi': round(predicted_aqi, 1)
-        })
+        }
+        if interval is not None:
+            day_forecast['lower'] = round(interval[0], 1)
+            day_forecast['upper'] = round(interval[1], 1)
+        city_forecast.append(day_forecast)
         
         day_stats.append(f"{day_names[target_day_of_week]}({sample_count} samples)")
     
@@ -179,15 +154,22 @@ for city in cities:
     print(f"  ✅ {city}: {aqi_values}")
     print(f"     Day samples: {', '.join(day_stats)}")
 
-# Save to JSON file
+# Save per-city shards + manifest (what the backend reads per request)
+shard_dir = 'precomputed-forecasts'
+manifest = write_sharded(shard_dir, forecasts, fmt=args.format, metadata={
+    'forecastDays': 7,
+    'method': 'day-of-week',
+})
+
+# Single compact file kept for older readers
 output_file = 'precomputed-forecasts.json'
-with open(output_file, 'w') as f:
-    json.dump(forecasts, f, indent=2)
+write_json_atomic(output_file, forecasts)
 
 print(f"\n🎉 Day-of-week specific forecasts generated for {len(forecasts)} cities!")
+print(f"💾 Saved {manifest['totalCities']} shards to {shard_dir}/ ({args.format})")
 print(f"💾 Saved to {output_file}")
 print(f"\n📊 METHOD: Each day's prediction is based on historical data for that specific weekday")
 print(f"   ✅ Monday predictions → Average of all historical Mondays")
 print(f"   ✅ Tuesday predictions → Average of all historical Tuesdays")
 print(f"   ✅ Wednesday predictions → Average of all historical Wednesdays")
-print(f"   ✅ etc. (70% recent trend + 30% historical average)")
+print(f"   ✅ etc. (PM2.5: 70% last {RECENT_WEEKS} weeks + 30% historical average, from {PROFILE_FILE})")
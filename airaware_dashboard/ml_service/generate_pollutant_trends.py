@@ -4,18 +4,25 @@ Trains on latest 100 data points and predicts 7-day trends for each pollutant
 Similar to precomputed-forecasts.json approach
 """
 
+import argparse
+import os
 import pandas as pd
 import numpy as np
-import json
 from datetime import datetime, timedelta
 from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import StandardScaler
+from artifacts import FORMATS, write_json_atomic, write_sharded
 import warnings
 warnings.filterwarnings('ignore')
 
+parser = argparse.ArgumentParser(description="Generate 7-day pollutant trend forecasts")
+parser.add_argument('--format', choices=FORMATS, default='json',
+                    help="Shard format (msgpack requires the msgpack package)")
+args = parser.parse_args()
+
 # File paths
 CSV_PATH = 'city_hour_final.csv'
 OUTPUT_FILE = 'precomputed-pollutant-trends.json'
+SHARD_DIR = 'precomputed-pollutant-trends'
 
 # Pollutants to forecast - all pollutants present in CSV
 POLLUTANTS = ['PM2.5', 'NO', 'NO2', 'NOx', 'NH3', 'CO', 'SO2', 'O3', 'Benzene', 'Toluene']
@@ -155,14 +162,17 @@ final_output = {
     'forecasts': all_forecasts
 }
 
-# Save to JSON
-print('💾 Saving forecasts to JSON...')
-with open(OUTPUT_FILE, 'w') as f:
-    json.dump(final_output, f, indent=2)
+# Save per-city shards + manifest (what the backend reads per request)
+print('💾 Saving forecasts...')
+manifest = write_sharded(SHARD_DIR, all_forecasts, fmt=args.format, metadata=final_output['metadata'])
+
+# Single compact file kept for older readers
+write_json_atomic(OUTPUT_FILE, final_output)
 
 print(f'\n✅ SUCCESS! Generated forecasts for {len(all_forecasts)} cities')
+print(f'📂 Shards: {SHARD_DIR}/ ({args.format}, largest {max([c["bytes"] for c in manifest["cities"].values()] or [0]) / 1024:.2f} KB)')
 print(f'📄 Saved to: {OUTPUT_FILE}')
-print(f'📊 File size: {len(json.dumps(final_output)) / 1024:.2f} KB')
+print(f'📊 File size: {os.path.getsize(OUTPUT_FILE) / 1024:.2f} KB')
 
 # Print sample output
 if len(all_forecasts) > 0:
@@ -1,10 +1,26 @@
-from fastapi import FastAPI, HTTPException
+import time
+PROCESS_STARTED_AT = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Dict, Optional
-import pandas as pd
 from model_service import MLModelService
+import data_store
+from rollups import RollupStore, to_day
+from correlations import CorrelationStore
+from downsample import METHODS, SeriesStore
+from online_state import DropDirWatcher, OnlineStore, parse_datetime, write_drop_file
+from alerts import SEVERITY_ORDER, AlertEngine, load_rules
+from features import estimate_aqi_from_pm25
+from weekday_profiles import PROFILE_FILE, WeekdayProfileStore
+import worker_stats
+from result_cache import ResultCache, SharedGeneration, cache_key
+import asyncio
 import json
+import os
+from datetime import datetime, timedelta
+import numpy as np
 
 app = FastAPI(title="AirAware ML Service", description="Machine Learning Service for Air Quality Prediction", version="1.0.0")
 
@@ -18,13 +34,170 @@ app.add_middleware(
 )
 
 # Initialize ML service
-ml_service = MLModelService()
+ml_service = MLModelService(started_at=PROCESS_STARTED_AT)
+
+# Bumped by /model/reload and /cache/invalidate; shared with forked workers
+model_generation = SharedGeneration()
+data_generation = SharedGeneration()
+loaded_model_generation = model_generation.value
+
+# Results of repeat requests are served without touching the model
+result_cache = ResultCache(
+    max_entries=int(os.environ.get("ML_CACHE_MAX_ENTRIES", 2048)),
+    max_bytes=int(os.environ.get("ML_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+    ttl_seconds=float(os.environ.get("ML_CACHE_TTL_SECONDS", 3600)),
+    generation=data_generation,
+)
+
+def ensure_current_model():
+    """Reload the model if another worker handled /model/reload"""
+    global loaded_model_generation
+    if loaded_model_generation != model_generation.value:
+        loaded_model_generation = model_generation.value
+        ml_service.load_model()
+        result_cache.invalidate()
+
+# Stores derived from the hourly dataset, built on first use (or in preload)
+rollup_store = None
+correlation_store = None
+series_store = None
+online_store = None
+alert_engine = None
+
+# Readings arrive through this directory (the local stand-in for the live
+# feed); every worker tails it, so all of them see every reading
+INGEST_DIR = os.environ.get("ML_INGEST_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingest_drop"))
+INGEST_POLL_SECONDS = float(os.environ.get("ML_INGEST_POLL_SECONDS", 5))
+
+def get_rollups() -> Optional[RollupStore]:
+    global rollup_store
+    if rollup_store is None:
+        df = data_store.get_dataset()
+        if df is not None:
+            rollup_store = RollupStore.from_frame(df)
+            print(f"Rollups built: {rollup_store.bucket_count():,} buckets for {len(rollup_store.cities)} cities")
+    return rollup_store
+
+def get_correlations() -> Optional[CorrelationStore]:
+    global correlation_store
+    if correlation_store is None:
+        df = data_store.get_dataset()
+        if df is not None:
+            correlation_store = CorrelationStore.from_frame(df)
+    return correlation_store
+
+def get_series_store() -> Optional[SeriesStore]:
+    global series_store
+    if series_store is None:
+        df = data_store.get_dataset()
+        if df is not None:
+            series_store = SeriesStore(df)
+    return series_store
+
+def get_online_store() -> OnlineStore:
+    global online_store
+    if online_store is None:
+        # Start from the profiles generate_forecasts.py saved; only newer rows are folded in
+        profiles = WeekdayProfileStore.load_or_new(os.path.join(data_store.DATA_DIR, PROFILE_FILE))
+        online_store = OnlineStore.from_frame(data_store.get_dataset(), profiles)
+    return online_store
+
+def get_alert_engine() -> AlertEngine:
+    global alert_engine
+    if alert_engine is None:
+        rules = load_rules(os.environ.get("ML_ALERT_RULES"))
+        alert_engine = AlertEngine.from_frame(data_store.get_dataset(), rules)
+    return alert_engine
+
+def apply_readings(city: str, readings: List[Dict]):
+    """Fold new readings into the online state, alerts and the derived stores"""
+    # Build the derived stores first so none of them misses these readings
+    get_rollups()
+    get_correlations()
+    get_series_store()
+    engine = get_alert_engine()
+    accepted = get_online_store().ingest(city, readings)
+    if not accepted:
+        return
+    for when, values in accepted:
+        engine.observe(city, when, values)
+    # Forecasts for this city are recomputed lazily on the next request
+    result_cache.invalidate(tag=city)
+
+    import pandas as pd
+    frame = pd.DataFrame(np.array([values for _, values in accepted]), columns=data_store.VALUE_COLUMNS)
+    frame.insert(0, 'Datetime', pd.to_datetime([when for when, _ in accepted]))
+    frame.insert(0, 'City', city)
+    for store in (rollup_store, correlation_store, series_store):
+        if store is not None:
+            store.add_rows(frame)
+
+drop_watcher = DropDirWatcher(INGEST_DIR, apply_readings)
+
+def parse_day(value: Optional[str], name: str) -> Optional[int]:
+    """Parse a YYYY-MM-DD query parameter into a day number"""
+    if not value:
+        return None
+    try:
+        return to_day(value[:10])
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} date: {value} (expected YYYY-MM-DD)")
+
+def preload():
+    """Load everything workers should share before serve.py forks them
+
+    Objects created here are inherited copy-on-write by every worker, so
+    read-only state (model, datasets) is held in memory once per node.
+    """
+    ml_service.set_threads(1)
+    ml_service.warm_up()
+    get_rollups()
+    get_correlations()
+    get_online_store()
+    get_alert_engine()
+    store = get_series_store()
+    if store is not None:
+        store.build_all()
+
+@app.middleware("http")
+async def record_worker_stats(request: Request, call_next):
+    """Count requests per worker for the aggregated /health report"""
+    try:
+        response = await call_next(request)
+    except Exception:
+        worker_stats.record_request(error=True)
+        raise
+    worker_stats.record_request(error=response.status_code >= 500)
+    return response
+
+async def poll_ingest_dir():
+    while True:
+        try:
+            drop_watcher.poll()
+        except Exception as e:
+            print(f"Ingest poll failed: {e}")
+        await asyncio.sleep(INGEST_POLL_SECONDS)
+
+@app.on_event("startup")
+async def warm_up_model():
+    # serve.py already warmed the model in preload(); plain uvicorn has not
+    if ml_service.ready_seconds is None:
+        ml_service.warm_up()
+
+@app.on_event("startup")
+async def start_ingest_polling():
+    # Runs on the event loop, so ingestion never races request handlers
+    asyncio.get_running_loop().create_task(poll_ingest_dir())
 
 # Pydantic models
 class PredictionRequest(BaseModel):
     data: List[Dict]
     features: Optional[List[str]] = None
 
+class IngestRequest(BaseModel):
+    city: str
+    readings: List[Dict]
+
 class PredictionResponse(BaseModel):
     predictions: List[float]
     feature_count: int
@@ -57,23 +230,267 @@ async def get_feature_importance():
 async def make_prediction(request: PredictionRequest):
     """Make predictions using the loaded model"""
     try:
-        # Convert request data to DataFrame
-        df = pd.DataFrame(request.data)
-        
-        if df.empty:
+        if not request.data:
             raise HTTPException(status_code=400, detail="No data provided for prediction")
         
-        # Make prediction
-        result = ml_service.predict(df)
+        ensure_current_model()
+        key = cache_key("predict", ml_service.model_version, data_generation.value, request.data)
+        result = result_cache.get(key)
+        
+        if result is None:
+            # Make prediction
+            predict_start = time.perf_counter()
+            result = ml_service.predict_records(request.data)
+            worker_stats.record_prediction(len(request.data), time.perf_counter() - predict_start)
+            if "error" not in result:
+                result_cache.set(key, result)
         
+        if "missing_features" in result:
+            raise HTTPException(status_code=400, detail={
+                "error": result["error"],
+                "missing_features": result["missing_features"]
+            })
         if "error" in result:
             raise HTTPException(status_code=400, detail=result["error"])
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/stats/summary")
+async def get_stats_summary(city: Optional[str] = None, start: Optional[str] = None,
+                            end: Optional[str] = None, pollutants: Optional[str] = None):
+    """Summary statistics (count, mean, std, min, max, quantiles) per pollutant
+
+    Answered from daily/monthly rollups; start and end are inclusive dates.
+    """
+    store = get_rollups()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Dataset not available")
+    if city is not None and city not in store.days:
+        raise HTTPException(status_code=404, detail=f"No data for {city}")
+    
+    columns = [p.strip() for p in pollutants.split(",")] if pollutants else None
+    result = store.summary(city, parse_day(start, "start"), parse_day(end, "end"), columns)
+    result["start"] = start
+    result["end"] = end
+    result["watermark"] = store.watermarks.get(city) if city else max(store.watermarks.values(), default=None)
+    return result
+
+@app.get("/stats/correlations")
+async def get_correlation_matrix(city: Optional[str] = None, start: Optional[str] = None,
+                                 end: Optional[str] = None, min_count: int = 3):
+    """Pairwise pollutant correlation matrix for a city / inclusive date range
+
+    Merged from per-day and per-month co-moment accumulators; pairs with
+    fewer than min_count joint readings are returned as null.
+    """
+    store = get_correlations()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Dataset not available")
+    if city is not None and city not in store.days:
+        raise HTTPException(status_code=404, detail=f"No data for {city}")
+    
+    result = store.correlation_matrix(city, parse_day(start, "start"), parse_day(end, "end"), min_count)
+    result["start"] = start
+    result["end"] = end
+    return result
+
+@app.get("/series")
+async def get_series(city: str, pollutant: str, start: Optional[str] = None, end: Optional[str] = None,
+                     width: int = 1000, method: str = "lttb"):
+    """Historical series downsampled to a chart's pixel width
+
+    method=lttb returns at most `width` points, method=minmax at most two
+    per pixel column. start/end accept ISO dates or datetimes; both are
+    inclusive, and a date-only end covers that whole day (as in /stats).
+    """
+    store = get_series_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Dataset not available")
+    if city not in store.times:
+        raise HTTPException(status_code=404, detail=f"No data for {city}")
+    if pollutant not in store.columns:
+        raise HTTPException(status_code=400, detail=f"Unknown pollutant: {pollutant}")
+    if method not in METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of: {', '.join(METHODS)}")
+    
+    try:
+        bounds = [None if not value else int(np.datetime64(value, "s").astype(np.int64)) for value in (start, end)]
+        if end and np.datetime_data(np.datetime64(end))[0] == "D":
+            bounds[1] += 86400 - 1
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid start/end (expected ISO date or datetime)")
+    
+    result = store.series(city, pollutant, bounds[0], bounds[1], width, method)
+    datetimes = np.datetime_as_string(result["times"].astype("datetime64[s]"))
+    values = np.round(result["values"], 2).tolist()
+    return {
+        "success": True,
+        "city": city,
+        "pollutant": pollutant,
+        "points": [{"datetime": d, "value": v} for d, v in zip(datetimes.tolist(), values)],
+        "metadata": {
+            "method": method,
+            "width": width,
+            "rawPoints": result["raw_points"],
+            "returnedPoints": len(values),
+            "source": result["source"]
+        }
+    }
+
+@app.post("/ingest")
+async def ingest_readings(request: IngestRequest):
+    """Accept new hourly readings for a city
+
+    Each reading needs a Datetime plus any pollutant / AQI values. The batch
+    is appended to the ingest directory (so every worker picks it up) and
+    applied to this worker right away.
+    """
+    if not request.readings:
+        raise HTTPException(status_code=400, detail="No readings provided")
+    # Reject the whole batch before anything reaches the drop directory
+    for i, reading in enumerate(request.readings):
+        try:
+            parse_datetime(reading["Datetime"])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400,
+                                detail=f"Reading {i} needs an ISO 8601 Datetime, got {reading.get('Datetime')!r}")
+
+    write_drop_file(INGEST_DIR, request.city, request.readings)
+    drop_watcher.poll()
+    state = get_online_store().cities[request.city]
+    return {"city": request.city, "received": len(request.readings), **state.status()}
+
+@app.get("/ingest/status")
+async def get_ingest_status():
+    """Online state per city (readings, window size, latest reading, version)"""
+    store = get_online_store()
+    return {"cities": {city: state.status() for city, state in sorted(store.cities.items())}}
+
+@app.get("/alerts")
+async def get_active_alerts(city: Optional[str] = None, severity: Optional[str] = None):
+    """Currently active threshold, rate-of-change and anomaly alerts
+
+    Evaluated as readings are ingested and served from memory.
+    """
+    if severity is not None and severity not in SEVERITY_ORDER:
+        raise HTTPException(status_code=400, detail=f"severity must be one of {sorted(SEVERITY_ORDER)}")
+    engine = get_alert_engine()
+    alerts = engine.active_alerts(city, severity)
+    return {
+        "success": True,
+        "city": city,
+        "alerts": alerts,
+        "count": len(alerts),
+        "stats": engine.stats()
+    }
+
+def compute_forecast(city: str, days: int, today: datetime) -> Dict:
+    """Day-of-week forecast from the online state
+
+    Pollutant inputs come from the shared weekday profiles (PM2.5 blends
+    70% recent weeks with 30% all history), AQI lags from the city's latest
+    readings; generate_forecasts.py builds its rows the same way. The
+    forecast covers the `days` days after `today` (at noon).
+    """
+    store = get_online_store()
+    state = store.cities[city]
+    today = today.replace(hour=12, minute=0, second=0, microsecond=0)
+    
+    dates, rows = [], []
+    for i in range(1, days + 1):
+        forecast_date = today + timedelta(days=i)
+        pollutants, _ = store.profiles.weekday_inputs(city, forecast_date.weekday())
+        dates.append(forecast_date)
+        rows.append(state.model_features(forecast_date, pollutants))
+    
+    intervals = None
+    if ml_service.model is None:
+        model = "CPCB PM2.5 estimate"
+        predictions = [estimate_aqi_from_pm25(row["PM2.5"]) if not np.isnan(row["PM2.5"]) else 0.0 for row in rows]
+    else:
+        model = "XGBoost (online features)"
+        result = ml_service.predict_records(rows)
+        # A loaded model that cannot predict is a server fault, not a reason
+        # to quietly serve the PM2.5 estimate instead
+        if "error" in result:
+            raise HTTPException(status_code=500, detail=result["error"])
+        predictions = result["predictions"]
+        intervals = result.get("prediction_intervals")
+    
+    def clamp(aqi):
+        return round(max(0.0, min(500.0, float(aqi))), 1)
+    
+    forecast = [
+        {"date": d.strftime("%b %d"), "day": d.strftime("%a"), "aqi": clamp(aqi)}
+        for d, aqi in zip(dates, predictions)
+    ]
+    if intervals:
+        intervals = {**intervals, "lower": [clamp(v) for v in intervals["lower"]],
+                     "upper": [clamp(v) for v in intervals["upper"]]}
+        for day, lower, upper in zip(forecast, intervals["lower"], intervals["upper"]):
+            day["lower"], day["upper"] = lower, upper
+    
+    return {
+        "success": True,
+        "city": city,
+        "forecast": forecast,
+        "prediction_intervals": intervals,
+        "model": model,
+        "dataVersion": state.version,
+        "lastReading": state.last_datetime.isoformat() if state.last_datetime else None,
+        "generated": datetime.now().isoformat()
+    }
+
+@app.get("/forecast/{city}")
+async def get_city_forecast(city: str, days: int = 7):
+    """7-day AQI forecast from the rolling online state
+
+    Cached per (model version, city, days, city data version, base date);
+    ingesting readings for the city makes the cached forecast stale, and a
+    new day starts a new forecast.
+    """
+    ensure_current_model()
+    store = get_online_store()
+    if city not in store.cities:
+        raise HTTPException(status_code=404, detail=f"No data for {city}")
+    if not 1 <= days <= 30:
+        raise HTTPException(status_code=400, detail="days must be between 1 and 30")
+    
+    today = datetime.now()
+    key = cache_key("forecast", ml_service.model_version, city, days, store.version(city), today.date().isoformat())
+    return result_cache.get_or_compute(key, lambda: compute_forecast(city, days, today), tags=[city])
+
+@app.post("/model/reload")
+async def reload_model():
+    """Reload the model from disk in every worker and drop cached results"""
+    model_generation.bump()
+    data_generation.bump()
+    ensure_current_model()
+    return {
+        "model_loaded": ml_service.model is not None,
+        "model_version": ml_service.model_version
+    }
+
+@app.post("/cache/invalidate")
+async def invalidate_cache():
+    """Drop cached results in every worker (call after a data upload)"""
+    return {"data_generation": data_generation.bump()}
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Hit/miss metrics for this worker's result cache"""
+    return {
+        "worker": os.getpid(),
+        "model_version": ml_service.model_version,
+        "data_generation": data_generation.value,
+        **result_cache.stats()
+    }
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -82,7 +499,10 @@ async def health_check():
         return {
             "status": "healthy" if model_status else "unhealthy",
             "model_loaded": model_status,
-            "service": "ml_service"
+            "service": "ml_service",
+            "startup": ml_service.startup_info(),
+            "workers": worker_stats.summary(),
+            "cache": result_cache.stats()
         }
     except Exception as e:
         return {
@@ -92,5 +512,6 @@ async def health_check():
         }
 
 if __name__ == "__main__":
+    # Single process; use serve.py for the multi-worker production mode
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
@@ -1,37 +1,246 @@
-import joblib
-import pandas as pd
-import numpy as np
-from typing import Dict, List, Optional
+import json
 import os
+import time
 from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from features import time_features
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas, joblib and xgboost are imported where they are used. This does not
+# shorten startup: importing xgboost pulls in pandas, sklearn and joblib
+# itself (measured: no difference between native and pickled models).
+
+# Native XGBoost formats are preferred over the pickled sklearn wrapper: they
+# load straight into a Booster without unpickling the estimator, and do not
+# depend on the sklearn / xgboost versions the pickle was written with.
+NATIVE_MODEL_EXTENSIONS = (".ubj", ".json")
+MODEL_BASENAME = "best_model_xgboost"
+# Multi-quantile booster (train_quantile_model.py): one pass gives the median
+# and the interval bounds, so it is served in place of the point model
+QUANTILE_MODEL_BASENAME = "best_model_xgboost_quantiles"
+
+
+def resolve_model_path(directory: str) -> str:
+    """Return the preferred model file in directory (quantile, native, pickle)"""
+    candidates = [QUANTILE_MODEL_BASENAME + ext for ext in NATIVE_MODEL_EXTENSIONS]
+    candidates += [MODEL_BASENAME + ext for ext in NATIVE_MODEL_EXTENSIONS + (".pkl",)]
+    for name in candidates:
+        candidate = os.path.join(directory, name)
+        if os.path.exists(candidate):
+            return candidate
+    return os.path.join(directory, MODEL_BASENAME + ".pkl")
+
 
 class MLModelService:
-    def __init__(self, model_path: str = None):
-        """Initialize ML Model Service"""
+    def __init__(self, model_path: str = None, started_at: Optional[float] = None):
+        """Initialize ML Model Service
+
+        started_at is a time.perf_counter() reading taken when the process
+        started; it is used to report how long the service took to be ready.
+        """
         self.model = None
-        # Use correct path to the model file in ml_service directory
-        if model_path is None:
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            self.model_path = os.path.join(current_dir, "best_model_xgboost.pkl")
-        else:
-            self.model_path = model_path
+        self.model_format = None
+        self.model_version = None
+        self.quantiles = None
+        # Set by set_threads() and re-applied to every reloaded model
+        self.n_threads: Optional[int] = None
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.load_seconds = None
+        self.warm_up_seconds = None
+        self.ready_seconds = None
+        # Without an explicit path the preferred file in the ml_service
+        # directory is looked up again on every (re)load
+        self.explicit_path = model_path is not None
+        self.model_path = model_path
         self.load_model()
     
     def load_model(self):
         """Load the trained XGBoost model"""
+        load_start = time.perf_counter()
+        self.quantiles = None
+        if not self.explicit_path:
+            # Picks up a model trained since the last load (e.g. the quantile booster)
+            self.model_path = resolve_model_path(os.path.dirname(os.path.abspath(__file__)))
         try:
             if os.path.exists(self.model_path):
-                self.model = joblib.load(self.model_path)
-                print(f"Model loaded successfully from {self.model_path}")
+                if self.model_path.endswith(NATIVE_MODEL_EXTENSIONS):
+                    import xgboost as xgb
+                    booster = xgb.Booster()
+                    booster.load_model(self.model_path)
+                    self.model = booster
+                    self.model_format = "native"
+                    quantiles = booster.attr("quantiles")
+                    self.quantiles = json.loads(quantiles) if quantiles else None
+                else:
+                    import joblib
+                    self.model = joblib.load(self.model_path)
+                    self.model_format = "pickle"
+                if self.n_threads is not None:
+                    self.set_threads(self.n_threads)
+                self.load_seconds = time.perf_counter() - load_start
+                # Identifies the loaded weights in cache keys
+                stat = os.stat(self.model_path)
+                self.model_version = f"{os.path.basename(self.model_path)}:{int(stat.st_mtime)}:{stat.st_size}"
+                print(f"Model loaded successfully from {self.model_path} ({self.load_seconds:.3f}s)")
             else:
                 print(f"Model file not found at {self.model_path}")
                 self.model = None
+                self.model_version = None
         except Exception as e:
             print(f"Error loading model: {e}")
             self.model = None
+            self.model_version = None
+
+    def set_threads(self, n_threads: int):
+        """Limit the threads XGBoost uses per prediction
+
+        Forked serving workers run one thread each: the pool as a whole
+        already uses every core, and OpenMP thread pools are not fork-safe.
+        The setting sticks across load_model().
+        """
+        self.n_threads = n_threads
+        if self.model is None:
+            return
+        if self.is_native:
+            self.model.set_param({"nthread": n_threads})
+        elif hasattr(self.model, "set_params"):
+            self.model.set_params(n_jobs=n_threads)
+
+    def warm_up(self):
+        """Run one throwaway prediction so lazy imports and model setup
+        happen before traffic arrives (and before workers are forked)
+
+        Records how long that prediction took and how long the process took
+        from start to ready (model loaded and warmed).
+        """
+        if self.model is None:
+            return
+        warm_start = time.perf_counter()
+        names = self.model.feature_names if self.is_native else list(getattr(self.model, "feature_names_in_", []))
+        if names:
+            self.predict_records([{name: 0.0 for name in names}])
+        self.warm_up_seconds = time.perf_counter() - warm_start
+        self.ready_seconds = time.perf_counter() - self.started_at
+        print(f"Model warmed up in {self.warm_up_seconds:.3f}s (ready {self.ready_seconds:.3f}s after start)")
+
+    @property
+    def is_native(self) -> bool:
+        return self.model_format == "native"
+
+    def startup_info(self) -> Dict:
+        """Cold-start timings (forked workers report the parent's preload)"""
+        return {
+            "model_format": self.model_format,
+            "model_load_seconds": self.load_seconds,
+            "warm_up_seconds": self.warm_up_seconds,
+            "ready_seconds": self.ready_seconds,
+        }
+
+    @staticmethod
+    def _feature_value(row: Dict, date_parts: Dict, name: str) -> float:
+        """Look up a model feature in a request row"""
+        value = row.get(name)
+        if value is None:
+            # The Node backend sends PM2.5 as PM2_5
+            value = row.get(name.replace('.', '_'))
+        if value is None:
+            value = date_parts.get(name)
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return float('nan')
+
+    @staticmethod
+    def _has_feature(row: Dict, date_parts: Dict, name: str) -> bool:
+        """Whether a row provides a feature (an explicit null counts as provided)"""
+        return name in row or name.replace('.', '_') in row or name in date_parts
+
+    def _split_quantiles(self, raw):
+        """(point predictions, prediction_intervals) from raw booster output
+
+        A multi-quantile booster returns one column per quantile; the median
+        is the point forecast and the outer quantiles bound the interval.
+        """
+        if not self.quantiles:
+            return raw, None
+        import numpy as np
+
+        # Independently fitted quantiles can cross; sorting each row fixes that
+        raw = np.sort(np.asarray(raw).reshape(-1, len(self.quantiles)), axis=1)
+        quantiles = sorted(self.quantiles)
+        median = quantiles.index(0.5) if 0.5 in quantiles else len(quantiles) // 2
+        return raw[:, median], {
+            "lower": raw[:, 0].tolist(),
+            "upper": raw[:, -1].tolist(),
+            "quantiles": [quantiles[0], quantiles[-1]]
+        }
+
+    def predict_records(self, records: List[Dict]) -> Dict:
+        """Make predictions for a list of feature rows
+
+        The model's own feature columns are taken from each row, in training
+        order, into a float matrix (a native Booster gets it as a DMatrix, a
+        pickled estimator as a DataFrame); other keys in the rows are ignored.
+        Pickled models without recorded feature names go through predict().
+        """
+        if self.model is None:
+            return {"error": "Model not loaded"}
+
+        if not self.is_native and not hasattr(self.model, "feature_names_in_"):
+            import pandas as pd
+            return self.predict(pd.DataFrame(records))
+
+        try:
+            import numpy as np
+
+            feature_names = self.model.feature_names if self.is_native else [str(name) for name in self.model.feature_names_in_]
+            if not feature_names:
+                return {"error": "Model has no feature names"}
+
+            X = np.empty((len(records), len(feature_names)), dtype=np.float32)
+            missing = set()
+            for i, row in enumerate(records):
+                date_parts = {}
+                if row.get('date'):
+                    date_parts = time_features(datetime.fromisoformat(str(row['date']).replace('Z', '+00:00')))
+                for j, name in enumerate(feature_names):
+                    if not self._has_feature(row, date_parts, name):
+                        missing.add(name)
+                    X[i, j] = self._feature_value(row, date_parts, name)
+
+            # Absent columns would silently become NaN; callers must send every
+            # feature (null is fine where a value is genuinely unknown)
+            if missing:
+                ordered = [name for name in feature_names if name in missing]
+                return {
+                    "error": f"Missing required features: {', '.join(ordered)}",
+                    "missing_features": ordered
+                }
+
+            if self.is_native:
+                import xgboost as xgb
+                raw = self.model.predict(xgb.DMatrix(X, feature_names=feature_names))
+            else:
+                import pandas as pd
+                raw = np.asarray(self.model.predict(pd.DataFrame(X, columns=feature_names)))
+            predictions, prediction_intervals = self._split_quantiles(raw)
+
+            return {
+                "predictions": predictions.tolist(),
+                "feature_count": len(feature_names),
+                "prediction_intervals": prediction_intervals,
+                "timestamp": datetime.now().isoformat()
+            }
+
+        except Exception as e:
+            return {"error": f"Prediction failed: {str(e)}"}
     
-    def preprocess_data(self, df: pd.DataFrame) -> pd.DataFrame:
+    def preprocess_data(self, df: "pd.DataFrame") -> "pd.DataFrame":
         """Preprocess data for model prediction"""
+        import pandas as pd
         try:
             # Basic preprocessing - adjust based on your model requirements
             processed_df = df.copy()
@@ -54,7 +263,7 @@ class MLModelService:
             print(f"Error in preprocessing: {e}")
             return df
     
-    def predict(self, data: pd.DataFrame) -> Dict:
+    def predict(self, data: "pd.DataFrame") -> Dict:
         """Make predictions using the loaded model"""
         if self.model is None:
             return {"error": "Model not loaded"}
@@ -73,10 +282,14 @@ class MLModelService:
             X = processed_data[feature_columns]
             
             # Make predictions
-            predictions = self.model.predict(X)
+            prediction_intervals = None
+            if self.is_native:
+                import xgboost as xgb
+                predictions, prediction_intervals = self._split_quantiles(self.model.predict(xgb.DMatrix(X)))
+            else:
+                predictions = self.model.predict(X)
             
             # Calculate confidence intervals if available
-            prediction_intervals = None
             if hasattr(self.model, 'predict_quantiles'):
                 try:
                     lower_bound = self.model.predict_quantiles(X, quantiles=[0.1])
@@ -106,7 +319,19 @@ class MLModelService:
             return {"error": "Model not loaded"}
         
         try:
-            if hasattr(self.model, 'feature_importances_'):
+            if self.is_native:
+                # Same normalised gain the sklearn wrapper reports
+                scores = self.model.get_score(importance_type='gain')
+                feature_names = self.model.feature_names or list(scores.keys())
+                total = sum(scores.values()) or 1.0
+                importance_dict = {name: scores.get(name, 0.0) / total for name in feature_names}
+                sorted_importance = dict(sorted(importance_dict.items(),
+                                              key=lambda x: x[1], reverse=True))
+                return {
+                    "feature_importance": sorted_importance,
+                    "total_features": len(feature_names)
+                }
+            elif hasattr(self.model, 'feature_importances_'):
                 feature_names = getattr(self.model, 'feature_names_in_', 
                                       [f"feature_{i}" for i in range(len(self.model.feature_importances_))])
                 
@@ -135,9 +360,16 @@ class MLModelService:
             info = {
                 "model_type": type(self.model).__name__,
                 "model_path": self.model_path,
+                "model_format": self.model_format,
+                "model_version": self.model_version,
                 "loaded": True
             }
             
+            if self.is_native:
+                info["n_estimators"] = self.model.num_boosted_rounds()
+                info["expected_features"] = list(self.model.feature_names or [])
+                info["quantiles"] = self.quantiles
+            
             # Add model-specific information
             if hasattr(self.model, 'n_estimators'):
                 info["n_estimators"] = self.model.n_estimators
@@ -0,0 +1,290 @@
+"""
+Rolling per-city state kept up to date as hourly readings stream in
+Each CityState holds the recent window (last RECENT_HOURS readings with
+running sums) and the AQI lag buffer the model features are built from;
+day-of-week profiles live in the shared WeekdayProfileStore. Adding a
+reading is O(1); nothing rereads the history.
+
+DropDirWatcher is the local stand-in for the live feed: it tails *.jsonl and
+*.csv files in a directory. Every serving worker polls the directory itself,
+so readings dropped there (including those posted to /ingest, appended to
+one file per day) reach the state of all workers.
+"""
+
+import csv
+import json
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from data_store import VALUE_COLUMNS
+from features import LAGS, lag_features, time_features
+from weekday_profiles import WeekdayProfileStore
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+RECENT_HOURS = 168
+# Drop files fully read and untouched for this long are no longer checked
+SEAL_SECONDS = 6 * 3600
+
+
+def parse_datetime(value) -> datetime:
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+
+
+def reading_values(reading: Dict) -> np.ndarray:
+    """VALUE_COLUMNS of a reading as floats (NaN where missing)"""
+    values = np.full(len(VALUE_COLUMNS), np.nan)
+    for i, col in enumerate(VALUE_COLUMNS):
+        raw = reading.get(col, reading.get(col.replace('.', '_')))
+        if raw is None or raw == '':
+            continue
+        try:
+            values[i] = float(raw)
+        except (TypeError, ValueError):
+            pass
+    return values
+
+
+class CityState:
+    """Recent window and lag buffer for one city"""
+
+    def __init__(self):
+        n = len(VALUE_COLUMNS)
+        self.recent = deque()
+        self.recent_sum = np.zeros(n)
+        self.recent_count = np.zeros(n, dtype=np.int64)
+        self.aqi_lags = deque(maxlen=LAGS)
+        self.last_datetime: Optional[datetime] = None
+        self.readings = 0
+        self.version = 0
+
+    def add(self, when: datetime, values: np.ndarray) -> bool:
+        """Fold one reading in; readings not newer than the last one are skipped"""
+        if self.last_datetime is not None and when <= self.last_datetime:
+            return False
+
+        present = ~np.isnan(values)
+        filled = np.where(present, values, 0.0)
+
+        self.recent.append((when, filled, present))
+        self.recent_sum += filled
+        self.recent_count += present
+        if len(self.recent) > RECENT_HOURS:
+            _, old_values, old_present = self.recent.popleft()
+            self.recent_sum -= old_values
+            self.recent_count -= old_present
+
+        # Missing AQI still takes its hour in the lags (as in build_feature_frame)
+        self.aqi_lags.append(float(values[VALUE_COLUMNS.index('AQI')]))
+
+        self.last_datetime = when
+        self.readings += 1
+        return True
+
+    def recent_means(self) -> Dict[str, float]:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = self.recent_sum / self.recent_count
+        return {col: float(means[i]) for i, col in enumerate(VALUE_COLUMNS)}
+
+    def model_features(self, when: datetime, pollutants: Dict[str, float] = None) -> Dict[str, float]:
+        """Feature row for the AQI model at `when`
+
+        pollutants defaults to the recent-window means.
+        """
+        row = dict(pollutants if pollutants is not None else self.recent_means())
+        row.update(lag_features(list(self.aqi_lags)))
+        row.update(time_features(when))
+        return row
+
+    def status(self) -> Dict:
+        return {
+            "readings": self.readings,
+            "recent_window": len(self.recent),
+            "last_datetime": self.last_datetime.isoformat() if self.last_datetime else None,
+            "version": self.version,
+        }
+
+
+class OnlineStore:
+    """CityState per city, their weekday profiles, and a change counter
+    (CityState.version) used to mark forecasts stale"""
+
+    def __init__(self, profiles: WeekdayProfileStore = None):
+        self.cities: Dict[str, CityState] = {}
+        self.profiles = profiles if profiles is not None else WeekdayProfileStore()
+
+    @classmethod
+    def from_frame(cls, df: "pd.DataFrame", profiles: WeekdayProfileStore = None) -> "OnlineStore":
+        """Seed from the historical dataset: weekday profiles over all rows
+        (on top of `profiles`, past their watermarks), recent window and lags
+        from each city's latest readings"""
+        store = cls(profiles)
+        if df is None or df.empty:
+            return store
+        store.profiles.add_rows(df)
+        columns = [col for col in VALUE_COLUMNS if col in df.columns]
+        idx = [VALUE_COLUMNS.index(col) for col in columns]
+        all_values = df[columns].to_numpy(dtype=float)
+        times = df['Datetime'].dt.to_pydatetime()
+
+        for city, rows in df.groupby('City', sort=False).indices.items():
+            state = store.cities.setdefault(city, CityState())
+            for i in rows[-RECENT_HOURS:]:
+                full = np.full(len(VALUE_COLUMNS), np.nan)
+                full[idx] = all_values[i]
+                state.add(times[i], full)
+        return store
+
+    def ingest(self, city: str, readings: Iterable[Dict]) -> List[Tuple[datetime, np.ndarray]]:
+        """Apply readings for one city; returns (datetime, values) of the new ones
+
+        Readings without a parseable Datetime are skipped. The city's version
+        is bumped whenever anything was accepted, which makes its cached
+        forecasts stale.
+        """
+        parsed = []
+        for reading in readings:
+            try:
+                parsed.append((parse_datetime(reading['Datetime']), reading_values(reading)))
+            except (KeyError, TypeError, ValueError):
+                continue
+
+        accepted = []
+        state = self.cities.setdefault(city, CityState())
+        for when, values in sorted(parsed, key=lambda item: item[0]):
+            if state.add(when, values):
+                self.profiles.add(city, when, values)
+                accepted.append((when, values))
+        if accepted:
+            state.version += 1
+        return accepted
+
+    def version(self, city: str) -> int:
+        state = self.cities.get(city)
+        return state.version if state else 0
+
+
+def write_drop_file(directory: str, city: str, readings: List[Dict]) -> str:
+    """Append a batch of readings to today's JSONL file in the drop directory
+
+    The batch goes out in a single O_APPEND write, so batches posted to
+    different workers at the same time do not interleave.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"ingest_{datetime.now():%Y%m%d}.jsonl")
+    lines = [json.dumps({**reading, 'City': city}, separators=(',', ':'), default=str) for reading in readings]
+    data = ('\n'.join(lines) + '\n').encode('utf-8')
+
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        written = 0
+        while written < len(data):
+            written += os.write(fd, data[written:])
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    return path
+
+
+class DropDirWatcher:
+    """Tail *.jsonl / *.csv files in a directory and hand new readings on
+
+    Each file is read from the last processed offset up to its last complete
+    line, so feeds may keep appending to the same file. poll() is called
+    periodically by the service (and right after /ingest writes a batch).
+
+    The directory is only relisted when its mtime changes, and a file that
+    has been read to the end and not modified for SEAL_SECONDS is sealed:
+    it is never stat'ed again, so a poll costs O(active files) however much
+    history the directory holds.
+    """
+
+    def __init__(self, directory: str, on_readings: Callable[[str, List[Dict]], None]):
+        self.directory = directory
+        self.on_readings = on_readings
+        self._offsets: Dict[str, int] = {}
+        self._csv_headers: Dict[str, List[str]] = {}
+        self._active: List[str] = []
+        self._sealed: Set[str] = set()
+        self._dir_mtime: Optional[int] = None
+
+    def poll(self) -> int:
+        """Process whatever is new in the directory; returns rows seen"""
+        try:
+            dir_stat = os.stat(self.directory)
+        except FileNotFoundError:
+            return 0
+        # Relist while the mtime is fresh too, in case the filesystem's
+        # timestamps are too coarse to tell two changes apart
+        now = time.time()
+        if dir_stat.st_mtime_ns != self._dir_mtime or now - dir_stat.st_mtime < 2:
+            self._dir_mtime = dir_stat.st_mtime_ns
+            self._active = [
+                os.path.join(self.directory, name) for name in sorted(os.listdir(self.directory))
+                if not name.startswith('.') and name.endswith(('.jsonl', '.csv'))
+                and os.path.join(self.directory, name) not in self._sealed
+            ]
+
+        total = 0
+        for path in list(self._active):
+            try:
+                file_stat = os.stat(path)
+            except FileNotFoundError:
+                self._active.remove(path)
+                continue
+            total += self._read_new(path, file_stat.st_size)
+            if self._offsets.get(path, 0) >= file_stat.st_size and now - file_stat.st_mtime > SEAL_SECONDS:
+                self._sealed.add(path)
+                self._active.remove(path)
+                self._offsets.pop(path, None)
+                self._csv_headers.pop(path, None)
+        return total
+
+    def _read_new(self, path: str, size: int) -> int:
+        offset = self._offsets.get(path, 0)
+        if size <= offset:
+            return 0
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            chunk = f.read()
+        end = chunk.rfind(b'\n') + 1
+        if end == 0:
+            return 0
+        lines = chunk[:end].decode('utf-8', errors='replace').splitlines()
+
+        rows = []
+        if path.endswith('.csv') and path not in self._csv_headers:
+            self._csv_headers[path] = next(csv.reader([lines[0]]))
+            lines = lines[1:]
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            # One malformed line is skipped; it must not cost the rest of the chunk
+            try:
+                if path.endswith('.csv'):
+                    row = next(csv.DictReader([line], fieldnames=self._csv_headers[path]))
+                else:
+                    row = json.loads(line)
+            except (ValueError, csv.Error) as e:
+                print(f"⚠️ Skipping malformed line {number} read from {os.path.basename(path)} at byte {offset}: {e}")
+                continue
+            if isinstance(row, dict):
+                rows.append(row)
+
+        by_city: Dict[str, List[Dict]] = {}
+        for row in rows:
+            if row.get('City') and row.get('Datetime'):
+                by_city.setdefault(row['City'], []).append(row)
+        for city, readings in by_city.items():
+            self.on_readings(city, readings)
+        # Only now is the chunk done; if a handler raised it is read again next poll
+        self._offsets[path] = offset + end
+        return len(rows)
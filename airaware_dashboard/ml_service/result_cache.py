@@ -0,0 +1,150 @@
+"""
+Bounded LRU/TTL cache for prediction and forecast results
+Entries are keyed on everything that can change the answer (model version,
+data watermark, canonicalised request) and bounded by entry count and by
+approximate size in bytes. Invalidation can be global or per tag (e.g. city).
+
+Cross-worker invalidation: each cache watches a SharedGeneration counter.
+Counters are created at import time, i.e. in the serve.py parent before
+workers are forked, so bumping one in any worker clears every worker's cache
+on its next lookup.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing import Value
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+class SharedGeneration:
+    """Monotonic counter shared by all forked workers"""
+
+    def __init__(self):
+        self._value = Value('Q', 0)
+
+    @property
+    def value(self) -> int:
+        return self._value.value
+
+    def bump(self) -> int:
+        with self._value.get_lock():
+            self._value.value += 1
+            return self._value.value
+
+
+def cache_key(namespace: str, *parts: Any) -> str:
+    """Stable key for JSON-serialisable parts (dict key order is ignored)"""
+    payload = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return f"{namespace}:{hashlib.sha1(payload.encode('utf-8')).hexdigest()}"
+
+
+def _estimate_bytes(value: Any) -> int:
+    try:
+        return len(json.dumps(value, separators=(',', ':'), default=str))
+    except (TypeError, ValueError):
+        return 1024
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024,
+                 ttl_seconds: float = 3600, generation: Optional[SharedGeneration] = None):
+        """Initialize an empty cache
+
+        max_entries / max_bytes bound the cache; the least recently used
+        entries are evicted first. Entries older than ttl_seconds are
+        treated as misses.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.generation = generation
+        self._seen_generation = generation.value if generation else 0
+        self._entries = OrderedDict()  # key -> (value, size, expires_at, tags)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def _sync_generation(self):
+        if self.generation is not None and self.generation.value != self._seen_generation:
+            self._seen_generation = self.generation.value
+            if self._entries:
+                self._stats["invalidations"] += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+
+    def _drop(self, key: str):
+        _, size, _, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            self._sync_generation()
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return default
+            if entry[2] < time.monotonic():
+                self._drop(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def set(self, key: str, value: Any, tags: Iterable[str] = (), ttl_seconds: Optional[float] = None):
+        size = _estimate_bytes(value)
+        if size > self.max_bytes:
+            return
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._sync_generation()
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, size, time.monotonic() + ttl, frozenset(tags))
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._stats["evictions"] += 1
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], tags: Iterable[str] = (),
+                       cacheable: Callable[[Any], bool] = lambda value: True) -> Any:
+        """Return the cached value, computing and storing it on a miss"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+        value = compute()
+        if cacheable(value):
+            self.set(key, value, tags)
+        return value
+
+    def invalidate(self, tag: Optional[str] = None) -> int:
+        """Drop all entries in this process, or only those carrying tag"""
+        with self._lock:
+            if tag is None:
+                keys = list(self._entries)
+            else:
+                keys = [k for k, entry in self._entries.items() if tag in entry[3]]
+            for key in keys:
+                self._drop(key)
+            self._stats["invalidations"] += len(keys)
+            return len(keys)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._sync_generation()
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": (self._stats["hits"] / lookups) if lookups else None,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+            }
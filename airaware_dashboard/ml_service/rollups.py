@@ -0,0 +1,335 @@
+"""
+Pre-aggregated rollups of the hourly dataset for summary statistics
+Hourly readings are rolled up into daily and monthly buckets per
+(city, pollutant). Each bucket keeps count, sum, sum of squares, min, max
+and a fixed log-spaced histogram used as a mergeable quantile sketch.
+
+A summary for any city / date range merges whole months plus the daily
+buckets at the range edges, so its cost depends on the number of buckets,
+not on the number of hourly rows. New readings are merged into the existing
+buckets with add_rows().
+"""
+
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from data_store import VALUE_COLUMNS
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Histogram sketch: bin 0 holds values below HIST_LOW (including zeros),
+# the last bin values at or above HIST_HIGH, the rest are log-spaced.
+HIST_BINS = 64
+HIST_LOW = 0.01
+HIST_HIGH = 5000.0
+HIST_EDGES = np.geomspace(HIST_LOW, HIST_HIGH, HIST_BINS - 1)
+
+DEFAULT_QUANTILES = (0.25, 0.5, 0.75, 0.9, 0.95, 0.99)
+
+# Open-ended ranges are clamped to these day numbers (years ~ -770 and ~4700)
+MIN_DAY = -1_000_000
+MAX_DAY = 1_000_000
+
+
+def to_day(value) -> int:
+    """Day number (days since 1970-01-01) for a date/datetime/string"""
+    return int(np.datetime64(value, 'D').astype(np.int64))
+
+
+def day_to_month(days):
+    """Month number (months since 1970-01) for day number(s)"""
+    return np.asarray(days, dtype='datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+
+def month_start(months):
+    """First day number of month number(s)"""
+    return np.asarray(months, dtype='datetime64[M]').astype('datetime64[D]').astype(np.int64)
+
+
+def split_range(first_day: Optional[int], last_day: Optional[int]) -> Tuple[Optional[Tuple[int, int]], List[Tuple[int, int]]]:
+    """Cover the inclusive day range with whole months plus edge day ranges
+
+    Returns ((first_month, last_month) or None, [(first_day, last_day), ...]).
+    """
+    lo = MIN_DAY if first_day is None else first_day
+    hi = MAX_DAY if last_day is None else last_day
+    if lo > hi:
+        return None, []
+
+    first_month = int(day_to_month(lo))
+    if int(month_start(first_month)) < lo:
+        first_month += 1
+    last_month = int(day_to_month(hi))
+    if int(month_start(last_month + 1)) - 1 > hi:
+        last_month -= 1
+
+    if first_month > last_month:
+        return None, [(lo, hi)]
+
+    edges = []
+    months_lo = int(month_start(first_month))
+    months_hi = int(month_start(last_month + 1)) - 1
+    if lo < months_lo:
+        edges.append((lo, months_lo - 1))
+    if months_hi < hi:
+        edges.append((months_hi + 1, hi))
+    return (first_month, last_month), edges
+
+
+class Aggregate:
+    """Moments, extremes and histogram per column for one or more buckets"""
+
+    __slots__ = ('count', 'total', 'total_sq', 'minimum', 'maximum', 'hist')
+
+    def __init__(self, count, total, total_sq, minimum, maximum, hist):
+        self.count = count
+        self.total = total
+        self.total_sq = total_sq
+        self.minimum = minimum
+        self.maximum = maximum
+        self.hist = hist
+
+    @classmethod
+    def empty(cls, n_columns: int) -> "Aggregate":
+        return cls(
+            np.zeros(n_columns, dtype=np.int64),
+            np.zeros(n_columns),
+            np.zeros(n_columns),
+            np.full(n_columns, np.nan),
+            np.full(n_columns, np.nan),
+            np.zeros((n_columns, HIST_BINS), dtype=np.int64),
+        )
+
+    def merge(self, other: "Aggregate"):
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.minimum = np.fmin(self.minimum, other.minimum)
+        self.maximum = np.fmax(self.maximum, other.maximum)
+        self.hist += other.hist
+
+    def quantile(self, column: int, q: float) -> Optional[float]:
+        """Approximate quantile from the histogram (linear within a bin)"""
+        n = self.count[column]
+        if n == 0:
+            return None
+        hist = self.hist[column]
+        target = q * n
+        cumulative = np.cumsum(hist)
+        b = int(np.searchsorted(cumulative, target, side='left'))
+        b = min(b, HIST_BINS - 1)
+        before = cumulative[b] - hist[b]
+        fraction = (target - before) / hist[b] if hist[b] else 0.0
+
+        lower = HIST_EDGES[b - 1] if b > 0 else min(0.0, self.minimum[column])
+        upper = HIST_EDGES[b] if b < HIST_BINS - 1 else self.maximum[column]
+        lower = max(lower, self.minimum[column])
+        upper = min(upper, self.maximum[column])
+        return float(lower + (upper - lower) * min(max(fraction, 0.0), 1.0))
+
+    def summary(self, column: int, quantiles=DEFAULT_QUANTILES) -> Dict:
+        n = int(self.count[column])
+        if n == 0:
+            return {"count": 0}
+        mean = self.total[column] / n
+        variance = (self.total_sq[column] - n * mean * mean) / (n - 1) if n > 1 else 0.0
+        result = {
+            "count": n,
+            "mean": float(mean),
+            "std": float(np.sqrt(max(variance, 0.0))),
+            "min": float(self.minimum[column]),
+            "max": float(self.maximum[column]),
+        }
+        for q in quantiles:
+            result[f"p{int(round(q * 100))}"] = self.quantile(column, q)
+        return result
+
+
+def aggregate_sorted(keys: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, Aggregate]:
+    """Aggregate rows into one bucket per distinct key
+
+    keys must be sorted; values has shape (rows, columns) with NaN for
+    missing readings. Returned arrays have a leading bucket dimension.
+    """
+    n_columns = values.shape[1]
+    unique_keys, starts, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    n_buckets = len(unique_keys)
+
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0.0)
+    count = np.add.reduceat(present.astype(np.int64), starts, axis=0)
+    total = np.add.reduceat(filled, starts, axis=0)
+    total_sq = np.add.reduceat(filled * filled, starts, axis=0)
+    minimum = np.fmin.reduceat(values, starts, axis=0)
+    maximum = np.fmax.reduceat(values, starts, axis=0)
+
+    bins = np.searchsorted(HIST_EDGES, np.where(present, values, 0.0), side='right')
+    flat = (inverse[:, None] * n_columns + np.arange(n_columns)[None, :]) * HIST_BINS + bins
+    hist = np.bincount(flat[present], minlength=n_buckets * n_columns * HIST_BINS)
+    hist = hist.reshape(n_buckets, n_columns, HIST_BINS)
+
+    return unique_keys, Aggregate(count, total, total_sq, minimum, maximum, hist)
+
+
+def coarsen(keys: np.ndarray, buckets: Aggregate, coarse_keys: np.ndarray) -> Tuple[np.ndarray, Aggregate]:
+    """Merge sorted buckets into coarser buckets (e.g. days into months)"""
+    unique_keys, starts = np.unique(coarse_keys, return_index=True)
+    return unique_keys, Aggregate(
+        np.add.reduceat(buckets.count, starts, axis=0),
+        np.add.reduceat(buckets.total, starts, axis=0),
+        np.add.reduceat(buckets.total_sq, starts, axis=0),
+        np.fmin.reduceat(buckets.minimum, starts, axis=0),
+        np.fmax.reduceat(buckets.maximum, starts, axis=0),
+        np.add.reduceat(buckets.hist, starts, axis=0),
+    )
+
+
+class RollupLevel:
+    """Sorted buckets of one granularity for one city"""
+
+    def __init__(self, n_columns: int):
+        self.keys = np.empty(0, dtype=np.int64)
+        self.buckets = Aggregate(
+            np.zeros((0, n_columns), dtype=np.int64),
+            np.zeros((0, n_columns)),
+            np.zeros((0, n_columns)),
+            np.zeros((0, n_columns)),
+            np.zeros((0, n_columns)),
+            np.zeros((0, n_columns, HIST_BINS), dtype=np.int64),
+        )
+
+    def merge(self, keys: np.ndarray, partial: Aggregate):
+        """Add partial aggregates; existing buckets are updated in place"""
+        pos = np.searchsorted(self.keys, keys)
+        hit = pos < len(self.keys)
+        hit[hit] = self.keys[pos[hit]] == keys[hit]
+
+        if hit.any():
+            idx = pos[hit]
+            b = self.buckets
+            b.count[idx] += partial.count[hit]
+            b.total[idx] += partial.total[hit]
+            b.total_sq[idx] += partial.total_sq[hit]
+            b.minimum[idx] = np.fmin(b.minimum[idx], partial.minimum[hit])
+            b.maximum[idx] = np.fmax(b.maximum[idx], partial.maximum[hit])
+            b.hist[idx] += partial.hist[hit]
+
+        new = ~hit
+        if new.any():
+            all_keys = np.concatenate([self.keys, keys[new]])
+            order = np.argsort(all_keys, kind='mergesort')
+            self.keys = all_keys[order]
+            for name in Aggregate.__slots__:
+                merged = np.concatenate([getattr(self.buckets, name), getattr(partial, name)[new]])
+                setattr(self.buckets, name, merged[order])
+
+    def select(self, first_key: int, last_key: int) -> Tuple[Aggregate, int]:
+        """Merge the buckets with first_key <= key <= last_key"""
+        lo = np.searchsorted(self.keys, first_key, side='left')
+        hi = np.searchsorted(self.keys, last_key, side='right')
+        b = self.buckets
+        n_columns = b.count.shape[1]
+        if hi <= lo:
+            return Aggregate.empty(n_columns), 0
+        return Aggregate(
+            b.count[lo:hi].sum(axis=0),
+            b.total[lo:hi].sum(axis=0),
+            b.total_sq[lo:hi].sum(axis=0),
+            np.fmin.reduce(b.minimum[lo:hi], axis=0),
+            np.fmax.reduce(b.maximum[lo:hi], axis=0),
+            b.hist[lo:hi].sum(axis=0),
+        ), int(hi - lo)
+
+
+class RollupStore:
+    """Daily and monthly rollups per city for every value column"""
+
+    def __init__(self, columns: List[str] = None):
+        self.columns = list(columns or VALUE_COLUMNS)
+        self.days: Dict[str, RollupLevel] = {}
+        self.months: Dict[str, RollupLevel] = {}
+        self.watermarks: Dict[str, str] = {}
+        self.rows_ingested = 0
+
+    @classmethod
+    def from_frame(cls, df: "pd.DataFrame") -> "RollupStore":
+        store = cls([col for col in VALUE_COLUMNS if col in df.columns])
+        store.add_rows(df)
+        return store
+
+    def add_rows(self, df: "pd.DataFrame"):
+        """Merge hourly rows (City, Datetime, value columns) into the rollups"""
+        if df is None or df.empty:
+            return
+        import pandas as pd
+
+        datetimes = pd.to_datetime(df['Datetime']).to_numpy()
+        day_keys = datetimes.astype('datetime64[D]').astype(np.int64)
+        values = np.column_stack([
+            pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float) if col in df.columns
+            else np.full(len(df), np.nan)
+            for col in self.columns
+        ])
+        cities = df['City'].to_numpy()
+
+        for city in pd.unique(cities):
+            rows = np.flatnonzero(cities == city)
+            order = rows[np.argsort(day_keys[rows], kind='mergesort')]
+            keys, daily = aggregate_sorted(day_keys[order], values[order])
+            month_keys, monthly = coarsen(keys, daily, day_to_month(keys))
+
+            self.days.setdefault(city, RollupLevel(len(self.columns))).merge(keys, daily)
+            self.months.setdefault(city, RollupLevel(len(self.columns))).merge(month_keys, monthly)
+
+            latest = str(pd.Timestamp(datetimes[rows].max()))
+            if latest > self.watermarks.get(city, ''):
+                self.watermarks[city] = latest
+
+        self.rows_ingested += len(df)
+
+    @property
+    def cities(self) -> List[str]:
+        return sorted(self.days)
+
+    def bucket_count(self) -> int:
+        return sum(len(level.keys) for level in self.days.values()) + \
+            sum(len(level.keys) for level in self.months.values())
+
+    def query(self, city: Optional[str] = None, first_day: Optional[int] = None,
+              last_day: Optional[int] = None) -> Tuple[Aggregate, int]:
+        """Merged aggregate for a city (or all cities) over an inclusive day range
+
+        Returns the aggregate and the number of buckets merged.
+        """
+        cities = [city] if city is not None else self.cities
+        months, edges = split_range(first_day, last_day)
+        result = Aggregate.empty(len(self.columns))
+        merged = 0
+        for name in cities:
+            if name not in self.days:
+                continue
+            if months is not None:
+                part, n = self.months[name].select(*months)
+                result.merge(part)
+                merged += n
+            for lo, hi in edges:
+                part, n = self.days[name].select(lo, hi)
+                result.merge(part)
+                merged += n
+        return result, merged
+
+    def summary(self, city: Optional[str] = None, first_day: Optional[int] = None,
+                last_day: Optional[int] = None, columns: List[str] = None) -> Dict:
+        """Summary statistics per column for a city / day range"""
+        aggregate, merged = self.query(city, first_day, last_day)
+        columns = columns or self.columns
+        return {
+            "city": city,
+            "buckets_merged": merged,
+            "pollutants": {
+                col: aggregate.summary(self.columns.index(col))
+                for col in columns if col in self.columns
+            },
+        }
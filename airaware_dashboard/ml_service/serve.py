@@ -0,0 +1,115 @@
+"""
+Production server for the ML service: preload once, then fork workers
+The parent process imports main.py (loading the model and any read-only data
+via main.preload()), binds the listening socket, and forks N uvicorn workers.
+Workers share the parent's memory pages copy-on-write, so RSS does not grow
+with the worker count. Dead workers are restarted in the same stats slot.
+
+Usage: python serve.py [--workers N] [--host 0.0.0.0] [--port 8001]
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+import worker_stats
+
+
+def run_worker(slot: int, sock: socket.socket, log_level: str):
+    """Body of a forked worker process; never returns"""
+    import uvicorn
+    import main
+
+    worker_stats.register(slot)
+    config = uvicorn.Config(main.app, log_level=log_level)
+    server = uvicorn.Server(config)
+    try:
+        server.run(sockets=[sock])
+    finally:
+        os._exit(0)
+
+
+def spawn(slot: int, sock: socket.socket, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        # Default signal handling in the child; uvicorn installs its own
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        run_worker(slot, sock, log_level)
+    return pid
+
+
+def serve(workers: int, host: str, port: int, log_level: str = "info"):
+    # Shared stats table first, so it exists in every forked worker
+    worker_stats.init(workers)
+
+    print(f"📦 Preloading model and data in parent (pid {os.getpid()})...")
+    preload_start = time.perf_counter()
+    import main
+    main.preload()
+    print(f"✅ Preload finished in {time.perf_counter() - preload_start:.2f}s")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # Move preloaded objects out of the collector's generations so that GC
+    # passes in the workers do not touch (and un-share) those pages
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    for slot in range(workers):
+        children[spawn(slot, sock, log_level)] = slot
+    print(f"🚀 Serving on http://{host}:{port} with {workers} workers")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is None or stopping:
+            continue
+        print(f"⚠️ Worker {pid} (slot {slot}) exited with status {status}, restarting")
+        children[spawn(slot, sock, log_level)] = slot
+
+    sock.close()
+    print("🛑 All workers stopped")
+
+
+if __name__ == "__main__":
+    if not hasattr(os, "fork"):
+        print("❌ serve.py needs os.fork(); use 'python main.py' on this platform")
+        sys.exit(1)
+
+    parser = argparse.ArgumentParser(description="Run the ML service with preloaded, forked workers")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    serve(args.workers, args.host, args.port, args.log_level)
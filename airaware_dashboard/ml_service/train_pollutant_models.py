@@ -3,16 +3,25 @@ Milestone 2 - Train ARIMA, Prophet, and XGBoost Models for Each Pollutant
 Generates pollutant-based forecast results for the dashboard
 """
 
+import argparse
 import pandas as pd
 import numpy as np
-from statsmodels.tsa.arima.model import ARIMA
-from prophet import Prophet
-from sklearn.metrics import mean_squared_error, mean_absolute_error
-from sklearn.preprocessing import MinMaxScaler
-import xgboost as xgb
 import warnings
 warnings.filterwarnings('ignore')
 
+# statsmodels, prophet, xgboost and sklearn are imported inside the model
+# sections below, so a run restricted with --models only loads what it uses.
+MODEL_CHOICES = ['arima', 'prophet', 'xgboost']
+
+parser = argparse.ArgumentParser(description="Train pollutant forecasting models")
+parser.add_argument('--models', default=','.join(MODEL_CHOICES),
+                    help="Comma-separated subset of: " + ', '.join(MODEL_CHOICES))
+args = parser.parse_args()
+selected_models = [m.strip().lower() for m in args.models.split(',') if m.strip()]
+unknown_models = [m for m in selected_models if m not in MODEL_CHOICES]
+if unknown_models:
+    parser.error(f"Unknown model(s): {', '.join(unknown_models)}")
+
 # Set random seeds for reproducibility
 np.random.seed(42)
 
@@ -32,6 +41,7 @@ pollutants = ['PM2.5', 'NO', 'NO2', 'NOx', 'NH3', 'CO', 'SO2', 'O3', 'Benzene',
 pollutants = [p for p in pollutants if p in df.columns]
 
 print(f"\n🎯 Target Pollutants: {', '.join(pollutants)}")
+print(f"🧪 Models: {', '.join(selected_models)}")
 
 # Initialize results storage
 arima_results = []
@@ -43,6 +53,11 @@ print("\n" + "=" * 80)
 print("TRAINING MODELS FOR EACH POLLUTANT")
 print("=" * 80)
 
+def score_forecast(y_true, y_pred):
+    """Return (RMSE, MAE) for a forecast"""
+    from sklearn.metrics import mean_squared_error, mean_absolute_error
+    return np.sqrt(mean_squared_error(y_true, y_pred)), mean_absolute_error(y_true, y_pred)
+
 # Helper function to create lag features for XGBoost
 def create_lag_features(data, n_lags=30):
     """Create lagged features for supervised learning"""
@@ -83,159 +98,167 @@ for pollutant in pollutants:
     # =========================================================================
     # ARIMA MODEL
     # =========================================================================
-    print("\n🔵 Training ARIMA...")
-    try:
-        # Auto-select best order (p,d,q) using AIC
-        arima_model = ARIMA(train[pollutant], order=(5,1,2))  # Common starting point
-        arima_fit = arima_model.fit()
+    arima_rmse = None
+    if 'arima' in selected_models:
+        print("\n🔵 Training ARIMA...")
+        try:
+            from statsmodels.tsa.arima.model import ARIMA
+
+            # Auto-select best order (p,d,q) using AIC
+            arima_model = ARIMA(train[pollutant], order=(5,1,2))  # Common starting point
+            arima_fit = arima_model.fit()
         
-        # Forecast
-        arima_forecast = arima_fit.forecast(steps=len(test))
+            # Forecast
+            arima_forecast = arima_fit.forecast(steps=len(test))
         
-        # Calculate metrics
-        arima_rmse = np.sqrt(mean_squared_error(test[pollutant], arima_forecast))
-        arima_mae = mean_absolute_error(test[pollutant], arima_forecast)
+            # Calculate metrics
+            arima_rmse, arima_mae = score_forecast(test[pollutant], arima_forecast)
         
-        print(f"   ✅ ARIMA RMSE: {arima_rmse:.4f}")
-        print(f"   ✅ ARIMA MAE:  {arima_mae:.4f}")
+            print(f"   ✅ ARIMA RMSE: {arima_rmse:.4f}")
+            print(f"   ✅ ARIMA MAE:  {arima_mae:.4f}")
         
-        # Store results
-        arima_results.append({
-            'Pollutant': pollutant,
-            'RMSE': round(arima_rmse, 4),
-            'MAE': round(arima_mae, 4),
-            'DataPoints': len(daily_data)
-        })
+            # Store results
+            arima_results.append({
+                'Pollutant': pollutant,
+                'RMSE': round(arima_rmse, 4),
+                'MAE': round(arima_mae, 4),
+                'DataPoints': len(daily_data)
+            })
         
-        model_comparison_results.append({
-            'Pollutant': pollutant,
-            'Model': 'ARIMA',
-            'RMSE': round(arima_rmse, 4),
-            'MAE': round(arima_mae, 4),
-            'DataPoints': len(daily_data)
-        })
+            model_comparison_results.append({
+                'Pollutant': pollutant,
+                'Model': 'ARIMA',
+                'RMSE': round(arima_rmse, 4),
+                'MAE': round(arima_mae, 4),
+                'DataPoints': len(daily_data)
+            })
         
-    except Exception as e:
-        print(f"   ❌ ARIMA failed: {str(e)[:100]}")
-        arima_rmse = None
+        except Exception as e:
+            print(f"   ❌ ARIMA failed: {str(e)[:100]}")
+            arima_rmse = None
     
     # =========================================================================
     # PROPHET MODEL
     # =========================================================================
-    print("\n🟣 Training Prophet...")
-    try:
-        # Prepare data for Prophet (requires 'ds' and 'y' columns)
-        prophet_train = train.rename(columns={'Datetime': 'ds', pollutant: 'y'})
-        prophet_test = test.rename(columns={'Datetime': 'ds', pollutant: 'y'})
+    prophet_rmse = None
+    if 'prophet' in selected_models:
+        print("\n🟣 Training Prophet...")
+        try:
+            from prophet import Prophet
+
+            # Prepare data for Prophet (requires 'ds' and 'y' columns)
+            prophet_train = train.rename(columns={'Datetime': 'ds', pollutant: 'y'})
+            prophet_test = test.rename(columns={'Datetime': 'ds', pollutant: 'y'})
         
-        # Initialize and train Prophet
-        model = Prophet(
-            daily_seasonality=True,
-            weekly_seasonality=True,
-            yearly_seasonality=True,
-            seasonality_mode='multiplicative',
-            changepoint_prior_scale=0.05
-        )
+            # Initialize and train Prophet
+            model = Prophet(
+                daily_seasonality=True,
+                weekly_seasonality=True,
+                yearly_seasonality=True,
+                seasonality_mode='multiplicative',
+                changepoint_prior_scale=0.05
+            )
         
-        model.fit(prophet_train)
+            model.fit(prophet_train)
         
-        # Create future dataframe for forecasting
-        future = model.make_future_dataframe(periods=len(test), freq='D')
-        forecast = model.predict(future)
+            # Create future dataframe for forecasting
+            future = model.make_future_dataframe(periods=len(test), freq='D')
+            forecast = model.predict(future)
         
-        # Get forecast for test period
-        prophet_forecast = forecast.tail(len(test))['yhat'].values
+            # Get forecast for test period
+            prophet_forecast = forecast.tail(len(test))['yhat'].values
         
-        # Calculate metrics
-        prophet_rmse = np.sqrt(mean_squared_error(test[pollutant], prophet_forecast))
-        prophet_mae = mean_absolute_error(test[pollutant], prophet_forecast)
+            # Calculate metrics
+            prophet_rmse, prophet_mae = score_forecast(test[pollutant], prophet_forecast)
         
-        print(f"   ✅ Prophet RMSE: {prophet_rmse:.4f}")
-        print(f"   ✅ Prophet MAE:  {prophet_mae:.4f}")
+            print(f"   ✅ Prophet RMSE: {prophet_rmse:.4f}")
+            print(f"   ✅ Prophet MAE:  {prophet_mae:.4f}")
         
-        # Store results
-        prophet_results.append({
-            'Pollutant': pollutant,
-            'RMSE': round(prophet_rmse, 4),
-            'MAE': round(prophet_mae, 4),
-            'DataPoints': len(daily_data)
-        })
+            # Store results
+            prophet_results.append({
+                'Pollutant': pollutant,
+                'RMSE': round(prophet_rmse, 4),
+                'MAE': round(prophet_mae, 4),
+                'DataPoints': len(daily_data)
+            })
         
-        model_comparison_results.append({
-            'Pollutant': pollutant,
-            'Model': 'Prophet',
-            'RMSE': round(prophet_rmse, 4),
-            'MAE': round(prophet_mae, 4),
-            'DataPoints': len(daily_data)
-        })
+            model_comparison_results.append({
+                'Pollutant': pollutant,
+                'Model': 'Prophet',
+                'RMSE': round(prophet_rmse, 4),
+                'MAE': round(prophet_mae, 4),
+                'DataPoints': len(daily_data)
+            })
         
-    except Exception as e:
-        print(f"   ❌ Prophet failed: {str(e)[:100]}")
-        prophet_rmse = None
+        except Exception as e:
+            print(f"   ❌ Prophet failed: {str(e)[:100]}")
+            prophet_rmse = None
     
     # =========================================================================
     # XGBOOST MODEL
     # =========================================================================
-    print("\n🟢 Training XGBoost...")
-    xgboost_rmse = None  # Initialize
-    try:
-        # Create lag features (use past 30 days as features)
-        lag_df = create_lag_features(daily_data[pollutant].values, n_lags=30)
+    xgboost_rmse = None
+    if 'xgboost' in selected_models:
+        print("\n🟢 Training XGBoost...")
+        try:
+            import xgboost as xgb
+
+            # Create lag features (use past 30 days as features)
+            lag_df = create_lag_features(daily_data[pollutant].values, n_lags=30)
         
-        if len(lag_df) < 50:
-            print(f"   ⚠️  Insufficient data for XGBoost ({len(lag_df)} samples)")
-            xgboost_rmse = None
-        else:
-            # Split features and target
-            X = lag_df.drop('target', axis=1)
-            y = lag_df['target']
+            if len(lag_df) < 50:
+                print(f"   ⚠️  Insufficient data for XGBoost ({len(lag_df)} samples)")
+                xgboost_rmse = None
+            else:
+                # Split features and target
+                X = lag_df.drop('target', axis=1)
+                y = lag_df['target']
             
-            # Train/test split (80/20)
-            train_size = int(len(X) * 0.8)
-            X_train, X_test = X[:train_size], X[train_size:]
-            y_train, y_test = y[:train_size], y[train_size:]
+                # Train/test split (80/20)
+                train_size = int(len(X) * 0.8)
+                X_train, X_test = X[:train_size], X[train_size:]
+                y_train, y_test = y[:train_size], y[train_size:]
             
-            # Build XGBoost model
-            xgb_model = xgb.XGBRegressor(
-                n_estimators=100,
-                learning_rate=0.1,
-                max_depth=6,
-                random_state=42,
-                verbosity=0  # Silent training
-            )
+                # Build XGBoost model
+                xgb_model = xgb.XGBRegressor(
+                    n_estimators=100,
+                    learning_rate=0.1,
+                    max_depth=6,
+                    random_state=42,
+                    verbosity=0  # Silent training
+                )
             
-            # Train model
-            xgb_model.fit(X_train, y_train)
+                # Train model
+                xgb_model.fit(X_train, y_train)
             
-            # Predict
-            xgboost_forecast = xgb_model.predict(X_test)
+                # Predict
+                xgboost_forecast = xgb_model.predict(X_test)
             
-            # Calculate metrics
-            xgboost_rmse = np.sqrt(mean_squared_error(y_test, xgboost_forecast))
-            xgboost_mae = mean_absolute_error(y_test, xgboost_forecast)
+                # Calculate metrics
+                xgboost_rmse, xgboost_mae = score_forecast(y_test, xgboost_forecast)
             
-            print(f"   ✅ XGBoost RMSE: {xgboost_rmse:.4f}")
-            print(f"   ✅ XGBoost MAE:  {xgboost_mae:.4f}")
+                print(f"   ✅ XGBoost RMSE: {xgboost_rmse:.4f}")
+                print(f"   ✅ XGBoost MAE:  {xgboost_mae:.4f}")
             
-            # Store results
-            xgboost_results.append({
-                'Pollutant': pollutant,
-                'RMSE': round(xgboost_rmse, 4),
-                'MAE': round(xgboost_mae, 4),
-                'DataPoints': len(daily_data)
-            })
+                # Store results
+                xgboost_results.append({
+                    'Pollutant': pollutant,
+                    'RMSE': round(xgboost_rmse, 4),
+                    'MAE': round(xgboost_mae, 4),
+                    'DataPoints': len(daily_data)
+                })
             
-            model_comparison_results.append({
-                'Pollutant': pollutant,
-                'Model': 'XGBoost',
-                'RMSE': round(xgboost_rmse, 4),
-                'MAE': round(xgboost_mae, 4),
-                'DataPoints': len(daily_data)
-            })
+                model_comparison_results.append({
+                    'Pollutant': pollutant,
+                    'Model': 'XGBoost',
+                    'RMSE': round(xgboost_rmse, 4),
+                    'MAE': round(xgboost_mae, 4),
+                    'DataPoints': len(daily_data)
+                })
         
-    except Exception as e:
-        print(f"   ❌ XGBoost failed: {str(e)[:100]}")
-        xgboost_rmse = None
+        except Exception as e:
+            print(f"   ❌ XGBoost failed: {str(e)[:100]}")
+            xgboost_rmse = None
     
     # =========================================================================
     # COMPARISON
@@ -259,25 +282,33 @@ print("\n" + "=" * 80)
 print("💾 SAVING RESULTS")
 print("=" * 80)
 
-# Save ARIMA results
-arima_df = pd.DataFrame(arima_results)
-arima_df.to_csv('arima_pollutant_results.csv', index=False)
-print(f"\n✅ Saved: arima_pollutant_results.csv ({len(arima_df)} pollutants)")
+# Only the models trained in this run are written, so a partial run
+# (--models) never overwrites another model's results with an empty file
+model_outputs = [
+    ('arima', 'ARIMA', '🔵', arima_results, 'arima_pollutant_results.csv'),
+    ('prophet', 'Prophet', '🟣', prophet_results, 'prophet_pollutant_results.csv'),
+    ('xgboost', 'XGBoost', '🟢', xgboost_results, 'xgboost_pollutant_results.csv'),
+]
+generated_files = []
+result_frames = {}
 
-# Save Prophet results
-prophet_df = pd.DataFrame(prophet_results)
-prophet_df.to_csv('prophet_pollutant_results.csv', index=False)
-print(f"✅ Saved: prophet_pollutant_results.csv ({len(prophet_df)} pollutants)")
-
-# Save XGBoost results
-xgboost_df = pd.DataFrame(xgboost_results)
-xgboost_df.to_csv('xgboost_pollutant_results.csv', index=False)
-print(f"✅ Saved: xgboost_pollutant_results.csv ({len(xgboost_df)} pollutants)")
+for key, label, _, results, filename in model_outputs:
+    if key not in selected_models:
+        continue
+    results_df = pd.DataFrame(results)
+    results_df.to_csv(filename, index=False)
+    result_frames[label] = (results_df, filename)
+    generated_files.append(filename)
+    print(f"✅ Saved: {filename} ({len(results_df)} pollutants)")
 
-# Save combined comparison
+# Save combined comparison (only meaningful when every model was trained)
 comparison_df = pd.DataFrame(model_comparison_results)
-comparison_df.to_csv('model_comparison_pollutant_results.csv', index=False)
-print(f"✅ Saved: model_comparison_pollutant_results.csv ({len(comparison_df)} rows)")
+if len(selected_models) == len(MODEL_CHOICES):
+    comparison_df.to_csv('model_comparison_pollutant_results.csv', index=False)
+    generated_files.append('model_comparison_pollutant_results.csv')
+    print(f"✅ Saved: model_comparison_pollutant_results.csv ({len(comparison_df)} rows)")
+else:
+    print("ℹ️  Partial run - model_comparison_pollutant_results.csv left unchanged")
 
 # ============================================================================
 # SUMMARY STATISTICS
@@ -286,34 +317,25 @@ print("\n" + "=" * 80)
 print("📊 SUMMARY STATISTICS")
 print("=" * 80)
 
-print("\n🔵 ARIMA Performance:")
-print(arima_df.to_string(index=False))
-print(f"\n   Average RMSE: {arima_df['RMSE'].mean():.4f}")
-print(f"   Best Pollutant: {arima_df.loc[arima_df['RMSE'].idxmin(), 'Pollutant']} (RMSE: {arima_df['RMSE'].min():.4f})")
-print(f"   Worst Pollutant: {arima_df.loc[arima_df['RMSE'].idxmax(), 'Pollutant']} (RMSE: {arima_df['RMSE'].max():.4f})")
-
-print("\n\n🟣 Prophet Performance:")
-print(prophet_df.to_string(index=False))
-print(f"\n   Average RMSE: {prophet_df['RMSE'].mean():.4f}")
-print(f"   Best Pollutant: {prophet_df.loc[prophet_df['RMSE'].idxmin(), 'Pollutant']} (RMSE: {prophet_df['RMSE'].min():.4f})")
-print(f"   Worst Pollutant: {prophet_df.loc[prophet_df['RMSE'].idxmax(), 'Pollutant']} (RMSE: {prophet_df['RMSE'].max():.4f})")
-
-print("\n\n🟢 XGBoost Performance:")
-print(xgboost_df.to_string(index=False))
-print(f"\n   Average RMSE: {xgboost_df['RMSE'].mean():.4f}")
-print(f"   Best Pollutant: {xgboost_df.loc[xgboost_df['RMSE'].idxmin(), 'Pollutant']} (RMSE: {xgboost_df['RMSE'].min():.4f})")
-print(f"   Worst Pollutant: {xgboost_df.loc[xgboost_df['RMSE'].idxmax(), 'Pollutant']} (RMSE: {xgboost_df['RMSE'].max():.4f})")
+for key, label, icon, _, _ in model_outputs:
+    if label not in result_frames or result_frames[label][0].empty:
+        continue
+    results_df = result_frames[label][0]
+    print(f"\n\n{icon} {label} Performance:")
+    print(results_df.to_string(index=False))
+    print(f"\n   Average RMSE: {results_df['RMSE'].mean():.4f}")
+    print(f"   Best Pollutant: {results_df.loc[results_df['RMSE'].idxmin(), 'Pollutant']} (RMSE: {results_df['RMSE'].min():.4f})")
+    print(f"   Worst Pollutant: {results_df.loc[results_df['RMSE'].idxmax(), 'Pollutant']} (RMSE: {results_df['RMSE'].max():.4f})")
 
-print("\n\n🏆 Best Model per Pollutant:")
-best_models = comparison_df.loc[comparison_df.groupby('Pollutant')['RMSE'].idxmin()]
-print(best_models[['Pollutant', 'Model', 'RMSE']].to_string(index=False))
+if not comparison_df.empty:
+    print("\n\n🏆 Best Model per Pollutant:")
+    best_models = comparison_df.loc[comparison_df.groupby('Pollutant')['RMSE'].idxmin()]
+    print(best_models[['Pollutant', 'Model', 'RMSE']].to_string(index=False))
 
 print("\n" + "=" * 80)
 print("✅ MILESTONE 2 COMPLETE!")
 print("=" * 80)
 print("\n📂 Generated Files:")
-print("   • arima_pollutant_results.csv")
-print("   • prophet_pollutant_results.csv")
-print("   • xgboost_pollutant_results.csv")
-print("   • model_comparison_pollutant_results.csv")
+for filename in generated_files:
+    print(f"   • {filename}")
 print("\n🚀 Ready to integrate with dashboard!")
@@ -0,0 +1,106 @@
+"""
+Train the multi-quantile XGBoost AQI model
+A single booster with objective reg:quantileerror fits the 10th, 50th and
+90th percentiles together (one output column each), so the ML service gets
+the point forecast (median) and an 80% prediction interval from one
+inference pass. Hyperparameters come from best_model_xgboost.tuning.json
+when tune_xgboost.py has been run.
+
+Saved as best_model_xgboost_quantiles.ubj; the service serves it in place
+of the point model (POST /model/reload to pick it up).
+
+Usage: python train_quantile_model.py [--quantiles 0.1,0.5,0.9] [--rounds 500]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from artifacts import write_atomic
+from data_store import DATA_PATH, load_dataset
+from features import MODEL_FEATURES, build_feature_frame
+from model_service import MODEL_BASENAME, QUANTILE_MODEL_BASENAME
+from tune_xgboost import BASE_DIR, BASELINE_PARAMS, booster_params, time_split, to_matrix
+
+TUNING_PATH = os.path.join(BASE_DIR, f"{MODEL_BASENAME}.tuning.json")
+
+
+def pinball_loss(y_true: np.ndarray, y_pred: np.ndarray, alpha: float) -> float:
+    diff = y_true - y_pred
+    return float(np.mean(np.maximum(alpha * diff, (alpha - 1) * diff)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the multi-quantile XGBoost AQI model")
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--quantiles', default='0.1,0.5,0.9')
+    parser.add_argument('--rounds', type=int, default=500, help="max boosting rounds")
+    parser.add_argument('--early-stopping', type=int, default=25)
+    parser.add_argument('--valid-fraction', type=float, default=0.15)
+    parser.add_argument('--test-fraction', type=float, default=0.15)
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=os.path.join(BASE_DIR, f"{QUANTILE_MODEL_BASENAME}.ubj"))
+    args = parser.parse_args()
+
+    quantiles = sorted(float(q) for q in args.quantiles.split(','))
+    if len(quantiles) < 2 or not all(0 < q < 1 for q in quantiles):
+        parser.error("--quantiles needs at least two values between 0 and 1")
+
+    import xgboost as xgb
+
+    print("=" * 80)
+    print(f"MULTI-QUANTILE XGBOOST ({', '.join(str(q) for q in quantiles)})")
+    print("=" * 80)
+
+    df = load_dataset(args.data)
+    if df is None:
+        print(f"❌ Dataset not found: {args.data}")
+        sys.exit(1)
+    train, valid, test = time_split(build_feature_frame(df), args.valid_fraction, args.test_fraction)
+    X_train, y_train = to_matrix(train)
+    X_valid, y_valid = to_matrix(valid)
+    X_test, y_test = to_matrix(test)
+    print(f"✅ Train: {len(train):,} | Valid: {len(valid):,} | Test: {len(test):,}")
+
+    tuned = BASELINE_PARAMS
+    if os.path.exists(TUNING_PATH):
+        with open(TUNING_PATH) as f:
+            tuned = json.load(f)['params']
+        print(f"🎯 Using tuned parameters from {os.path.basename(TUNING_PATH)}")
+    params = booster_params(tuned, args.seed, args.threads)
+    params.update(objective='reg:quantileerror', quantile_alpha=quantiles, eval_metric='quantile')
+
+    dtrain = xgb.DMatrix(X_train, label=y_train, feature_names=MODEL_FEATURES)
+    dvalid = xgb.DMatrix(X_valid, label=y_valid, feature_names=MODEL_FEATURES)
+    booster = xgb.train(params, dtrain, num_boost_round=args.rounds, evals=[(dvalid, 'valid')],
+                        early_stopping_rounds=args.early_stopping, verbose_eval=False)
+    rounds = booster.best_iteration + 1
+    print(f"🔁 Best iteration: {rounds} rounds")
+
+    predictions = np.sort(booster.predict(xgb.DMatrix(X_test, feature_names=MODEL_FEATURES),
+                                          iteration_range=(0, rounds)), axis=1)
+    for i, q in enumerate(quantiles):
+        print(f"   q={q:<4} pinball loss: {pinball_loss(y_test, predictions[:, i], q):.4f}")
+    coverage = np.mean((y_test >= predictions[:, 0]) & (y_test <= predictions[:, -1]))
+    median = predictions[:, quantiles.index(0.5) if 0.5 in quantiles else len(quantiles) // 2]
+    print(f"   Interval coverage: {coverage:.1%} (nominal {quantiles[-1] - quantiles[0]:.0%})")
+    print(f"   Median RMSE: {np.sqrt(np.mean((median - y_test) ** 2)):.4f}")
+
+    # Refit on everything before the test period for the served model
+    X_fit = np.vstack([X_train, X_valid])
+    y_fit = np.concatenate([y_train, y_valid])
+    final = xgb.train(params, xgb.DMatrix(X_fit, label=y_fit, feature_names=MODEL_FEATURES), num_boost_round=rounds)
+    # Lets the service split the output columns without extra metadata files
+    final.set_attr(quantiles=json.dumps(quantiles))
+
+    write_atomic(args.output, bytes(final.save_raw('ubj')))
+    print(f"\n💾 Saved {args.output}")
+    print("   POST /model/reload on the ML service to serve it")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+Hyperparameter search for the XGBoost AQI model
+Hyperband: several brackets of successive halving. Each bracket samples
+configurations, trains them all for a small number of boosting rounds,
+keeps the best 1/eta and gives the survivors eta times more rounds, until
+the max round budget is reached. Trials run in parallel (one core each)
+with early stopping on a time-ordered validation split, so the search never
+looks at hours after the ones it is scored on.
+
+Every trial is logged (fit time, CPU time, validation RMSE) to
+xgboost_tuning_results.csv. The search stops scheduling trials once the CPU
+budget is spent, so it fits a nightly window. The winner is refit on
+train + validation and saved to the model store as best_model_xgboost.ubj.
+The ML service picks it up on POST /model/reload unless a quantile model
+exists (that one is used first, here and by generate_forecasts.py; retrain
+it with train_quantile_model.py, which reads the tuned parameters).
+
+Usage: python tune_xgboost.py [--jobs 8] [--cpu-budget 3600] [--mode hyperband|halving]
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from artifacts import write_atomic, write_json_atomic
+from data_store import DATA_PATH, load_dataset
+from features import MODEL_FEATURES, build_feature_frame
+from model_service import MODEL_BASENAME, NATIVE_MODEL_EXTENSIONS, QUANTILE_MODEL_BASENAME
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = os.path.join(BASE_DIR, 'xgboost_tuning_results.csv')
+
+# Previous fixed settings, always evaluated as the first configuration
+BASELINE_PARAMS = {'max_depth': 6, 'learning_rate': 0.1}
+
+
+def sample_params(rng: random.Random) -> Dict:
+    """One configuration from the search space"""
+    return {
+        'max_depth': rng.randint(3, 10),
+        'learning_rate': round(10 ** rng.uniform(-2, math.log10(0.3)), 4),
+        'subsample': round(rng.uniform(0.5, 1.0), 3),
+        'colsample_bytree': round(rng.uniform(0.5, 1.0), 3),
+        'min_child_weight': round(10 ** rng.uniform(0, math.log10(20)), 3),
+        'reg_lambda': round(10 ** rng.uniform(-1, 1), 4),
+        'gamma': round(rng.uniform(0, 5), 3),
+    }
+
+
+def booster_params(params: Dict, seed: int, threads: int = 1) -> Dict:
+    return {
+        'objective': 'reg:squarederror',
+        'eval_metric': 'rmse',
+        'tree_method': 'hist',
+        'nthread': threads,
+        'seed': seed,
+        **params,
+    }
+
+
+def time_split(frame: pd.DataFrame, valid_fraction: float, test_fraction: float):
+    """Train / validation / test by timestamp (same cut-offs for every city)"""
+    times = np.sort(frame['Datetime'].unique())
+    valid_start = times[int(len(times) * (1 - valid_fraction - test_fraction))]
+    test_start = times[int(len(times) * (1 - test_fraction))]
+    train = frame[frame['Datetime'] < valid_start]
+    valid = frame[(frame['Datetime'] >= valid_start) & (frame['Datetime'] < test_start)]
+    test = frame[frame['Datetime'] >= test_start]
+    return train, valid, test
+
+
+def to_matrix(frame: pd.DataFrame):
+    return frame[MODEL_FEATURES].to_numpy(dtype=np.float32), frame['AQI'].to_numpy(dtype=np.float32)
+
+
+# Training data in each worker process, set once by the pool initializer
+_WORKER_DATA = {}
+
+
+def init_worker(X_train, y_train, X_valid, y_valid):
+    import xgboost as xgb
+
+    _WORKER_DATA['train'] = xgb.DMatrix(X_train, label=y_train, feature_names=MODEL_FEATURES)
+    _WORKER_DATA['valid'] = xgb.DMatrix(X_valid, label=y_valid, feature_names=MODEL_FEATURES)
+
+
+def run_trial(trial: Dict, early_stopping: int, seed: int) -> Dict:
+    """Train one configuration for trial['rounds'] rounds (with early stopping)"""
+    import xgboost as xgb
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    booster = xgb.train(
+        booster_params(trial['params'], seed),
+        _WORKER_DATA['train'],
+        num_boost_round=trial['rounds'],
+        evals=[(_WORKER_DATA['valid'], 'valid')],
+        early_stopping_rounds=early_stopping,
+        verbose_eval=False,
+    )
+    return {
+        **trial,
+        'valid_rmse': float(booster.best_score),
+        'best_iteration': int(booster.best_iteration),
+        'fit_seconds': time.perf_counter() - wall_start,
+        'cpu_seconds': time.process_time() - cpu_start,
+    }
+
+
+class Search:
+    """Runs rungs of trials on a process pool and keeps the trial log"""
+
+    def __init__(self, executor: ProcessPoolExecutor, cpu_budget: Optional[float], early_stopping: int, seed: int):
+        self.executor = executor
+        self.cpu_budget = cpu_budget
+        self.early_stopping = early_stopping
+        self.seed = seed
+        self.cpu_used = 0.0
+        self.trials: List[Dict] = []
+
+    @property
+    def exhausted(self) -> bool:
+        return self.cpu_budget is not None and self.cpu_used >= self.cpu_budget
+
+    def run_rung(self, trials: List[Dict]) -> List[Dict]:
+        """Run trials in parallel; returns the finished ones (budget permitting)"""
+        futures = [self.executor.submit(run_trial, trial, self.early_stopping, self.seed) for trial in trials]
+        finished = []
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            result = future.result()
+            self.cpu_used += result['cpu_seconds']
+            self.trials.append(result)
+            finished.append(result)
+            print(f"   #{result['config_id']:<3} bracket {result['bracket']} rung {result['rung']} "
+                  f"rounds {result['rounds']:>4} | RMSE {result['valid_rmse']:8.3f} "
+                  f"(best iter {result['best_iteration']}) | {result['fit_seconds']:6.1f}s")
+            if self.exhausted:
+                # Trials not yet started are dropped; running ones finish
+                for pending in futures:
+                    pending.cancel()
+        self.save_log()
+        return finished
+
+    def save_log(self):
+        rows = [
+            {
+                'ConfigId': t['config_id'], 'Bracket': t['bracket'], 'Rung': t['rung'], 'Rounds': t['rounds'],
+                'BestIteration': t['best_iteration'], 'ValidRMSE': round(t['valid_rmse'], 4),
+                'FitSeconds': round(t['fit_seconds'], 3), 'CpuSeconds': round(t['cpu_seconds'], 3),
+                'Params': json.dumps(t['params'], sort_keys=True),
+            }
+            for t in self.trials
+        ]
+        write_atomic(RESULTS_PATH, pd.DataFrame(rows).to_csv(index=False).encode('utf-8'))
+
+    def successive_halving(self, bracket: int, configs: List[Dict], min_rounds: int, max_rounds: int, eta: int):
+        rounds = min_rounds
+        rung = 0
+        while configs and not self.exhausted:
+            print(f"\n🔁 Bracket {bracket}, rung {rung}: {len(configs)} configs x {rounds} rounds")
+            trials = [{**config, 'bracket': bracket, 'rung': rung, 'rounds': rounds} for config in configs]
+            finished = sorted(self.run_rung(trials), key=lambda t: t['valid_rmse'])
+            if rounds >= max_rounds:
+                break
+            keep = max(len(finished) // eta, 1)
+            configs = [{'config_id': t['config_id'], 'params': t['params']} for t in finished[:keep]]
+            rounds = min(rounds * eta, max_rounds)
+            rung += 1
+
+    def best(self) -> Dict:
+        """Lowest validation RMSE; its best_iteration gives the round count"""
+        return min(self.trials, key=lambda t: t['valid_rmse'])
+
+
+def hyperband_brackets(min_rounds: int, max_rounds: int, eta: int, mode: str):
+    """[(configs, starting rounds)] per bracket, most aggressive first"""
+    s_max = max(int(math.floor(math.log(max_rounds / min_rounds, eta) + 1e-9)), 0)
+    brackets = []
+    for s in range(s_max, -1, -1):
+        n = int(math.ceil((s_max + 1) / (s + 1) * eta ** s))
+        rounds = max(int(round(max_rounds * eta ** -s)), 1)
+        brackets.append((n, rounds))
+        if mode == 'halving':
+            break
+    return brackets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the XGBoost AQI model (Hyperband / successive halving)")
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--mode', choices=['hyperband', 'halving'], default='hyperband')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help="parallel trials")
+    parser.add_argument('--cpu-budget', type=float, default=None, help="CPU seconds across all trials")
+    parser.add_argument('--min-rounds', type=int, default=30)
+    parser.add_argument('--max-rounds', type=int, default=810)
+    parser.add_argument('--eta', type=int, default=3)
+    parser.add_argument('--early-stopping', type=int, default=25)
+    parser.add_argument('--valid-fraction', type=float, default=0.15)
+    parser.add_argument('--test-fraction', type=float, default=0.15)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=os.path.join(BASE_DIR, f"{MODEL_BASENAME}.ubj"))
+    args = parser.parse_args()
+
+    import xgboost as xgb
+
+    print("=" * 80)
+    print("XGBOOST HYPERPARAMETER SEARCH")
+    print("=" * 80)
+
+    df = load_dataset(args.data)
+    if df is None:
+        print(f"❌ Dataset not found: {args.data}")
+        sys.exit(1)
+    frame = build_feature_frame(df)
+    train, valid, test = time_split(frame, args.valid_fraction, args.test_fraction)
+    print(f"✅ {len(frame):,} rows | Train: {len(train):,} | Valid: {len(valid):,} (from {valid['Datetime'].min()}) "
+          f"| Test: {len(test):,} (from {test['Datetime'].min()})")
+
+    X_train, y_train = to_matrix(train)
+    X_valid, y_valid = to_matrix(valid)
+    X_test, y_test = to_matrix(test)
+
+    rng = random.Random(args.seed)
+    brackets = hyperband_brackets(args.min_rounds, args.max_rounds, args.eta, args.mode)
+    print(f"🎯 {args.mode}: {len(brackets)} bracket(s), {sum(n for n, _ in brackets)} configs, "
+          f"{args.jobs} parallel trials, CPU budget: {args.cpu_budget or 'unlimited'}s")
+
+    started = time.perf_counter()
+    next_id = 0
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker,
+                             initargs=(X_train, y_train, X_valid, y_valid)) as executor:
+        search = Search(executor, args.cpu_budget, args.early_stopping, args.seed)
+        for bracket, (n_configs, min_rounds) in enumerate(brackets):
+            if search.exhausted:
+                print("\n⏱️  CPU budget spent, stopping search")
+                break
+            configs = []
+            for _ in range(n_configs):
+                params = dict(BASELINE_PARAMS) if next_id == 0 else sample_params(rng)
+                configs.append({'config_id': next_id, 'params': params})
+                next_id += 1
+            search.successive_halving(bracket, configs, min_rounds, args.max_rounds, args.eta)
+
+    if not search.trials:
+        print("❌ No trials finished within the budget")
+        sys.exit(1)
+
+    winner = search.best()
+    rounds = winner['best_iteration'] + 1
+    print(f"\n🏆 Best config #{winner['config_id']}: RMSE {winner['valid_rmse']:.4f} at {rounds} rounds")
+    print(f"   {json.dumps(winner['params'], sort_keys=True)}")
+    print(f"   {len(search.trials)} trials, {search.cpu_used:.0f} CPU s, {time.perf_counter() - started:.0f} s wall")
+
+    threads = args.jobs
+    params = booster_params(winner['params'], args.seed, threads)
+    dtrain = xgb.DMatrix(X_train, label=y_train, feature_names=MODEL_FEATURES)
+    booster = xgb.train(params, dtrain, num_boost_round=rounds)
+    test_rmse = float(np.sqrt(np.mean((booster.predict(xgb.DMatrix(X_test, feature_names=MODEL_FEATURES)) - y_test) ** 2)))
+    print(f"   Test RMSE (trained on train split): {test_rmse:.4f}")
+
+    # Refit on everything before the test period for the served model
+    X_fit = np.vstack([X_train, X_valid])
+    y_fit = np.concatenate([y_train, y_valid])
+    final = xgb.train(params, xgb.DMatrix(X_fit, label=y_fit, feature_names=MODEL_FEATURES), num_boost_round=rounds)
+
+    write_atomic(args.output, bytes(final.save_raw('ubj')))
+    metadata_path = os.path.splitext(args.output)[0] + '.tuning.json'
+    write_json_atomic(metadata_path, {
+        'params': winner['params'],
+        'num_boost_round': rounds,
+        'valid_rmse': round(winner['valid_rmse'], 4),
+        'test_rmse': round(test_rmse, 4),
+        'trials': len(search.trials),
+        'cpu_seconds': round(search.cpu_used, 1),
+        'mode': args.mode,
+        'trained_at': datetime.now().isoformat(),
+        'train_rows': len(X_fit),
+    })
+    print(f"\n💾 Saved {args.output} and {os.path.basename(metadata_path)}")
+    print(f"💾 Trial log: {os.path.basename(RESULTS_PATH)}")
+    quantile_models = [f"{QUANTILE_MODEL_BASENAME}{ext}" for ext in NATIVE_MODEL_EXTENSIONS
+                       if os.path.exists(os.path.join(os.path.dirname(os.path.abspath(args.output)),
+                                                      f"{QUANTILE_MODEL_BASENAME}{ext}"))]
+    if quantile_models:
+        # The service prefers the quantile model, which was trained with the old parameters
+        print(f"⚠️  {quantile_models[0]} is used in preference to this model (by the ML service")
+        print("   and generate_forecasts.py); run train_quantile_model.py, which reads the tuned")
+        print("   parameters, then POST /model/reload")
+    else:
+        print("   POST /model/reload on the ML service to serve the tuned model;")
+        print("   generate_forecasts.py uses it on its next run")
+
+
+if __name__ == "__main__":
+    main()
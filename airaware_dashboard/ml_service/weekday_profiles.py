@@ -0,0 +1,222 @@
+"""
+Per-city weekday/hour profile feature store
+For every (city, weekday, hour) slot we keep the running historical sum and
+count of each value column, plus a ring of that slot's last RECENT_WEEKS
+readings with running sums (the "recent trend"). Adding a reading touches one
+slot, and reading a profile never looks at raw rows, so the batch generator
+(generate_forecasts.py) and the online forecast path get the same
+day-of-week features at no per-forecast cost. The service loads the .npz
+the batch run saved, so both start from the same profiles.
+
+Forecast inputs (weekday_inputs) blend the recent trend into PM2.5 only;
+the other pollutants are the slot's historical means, NaN where a city has
+no readings.
+
+The store can be saved to / loaded from an .npz file; add_rows() only folds
+in rows newer than each city's watermark, so the batch run is incremental.
+"""
+
+import io
+import os
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from data_store import VALUE_COLUMNS
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+RECENT_WEEKS = 12
+RECENT_WEIGHT = 0.7
+BLENDED_COLUMNS = ('PM2.5',)
+# Below this many readings on a weekday, forecasts pool over all weekdays
+MIN_WEEKDAY_SAMPLES = 5
+PROFILE_FILE = 'weekday_profiles.npz'
+
+
+class CityProfile:
+    """Historical and recent-window sums per (weekday, hour) for one city"""
+
+    ARRAYS = ('hist_sum', 'hist_count', 'recent_values', 'recent_present',
+              'recent_sum', 'recent_count', 'recent_head')
+
+    def __init__(self, n_columns: int):
+        self.hist_sum = np.zeros((7, 24, n_columns))
+        self.hist_count = np.zeros((7, 24, n_columns), dtype=np.int64)
+        self.recent_values = np.zeros((7, 24, RECENT_WEEKS, n_columns))
+        self.recent_present = np.zeros((7, 24, RECENT_WEEKS, n_columns), dtype=bool)
+        self.recent_sum = np.zeros((7, 24, n_columns))
+        self.recent_count = np.zeros((7, 24, n_columns), dtype=np.int64)
+        self.recent_head = np.zeros((7, 24), dtype=np.int64)
+        self.last_datetime: Optional[datetime] = None
+
+    def push_recent(self, weekday: int, hour: int, values: np.ndarray):
+        """Replace the oldest reading in the slot's recent ring"""
+        present = ~np.isnan(values)
+        filled = np.where(present, values, 0.0)
+        k = self.recent_head[weekday, hour]
+        self.recent_sum[weekday, hour] += filled - self.recent_values[weekday, hour, k]
+        self.recent_count[weekday, hour] += present.astype(np.int64) - self.recent_present[weekday, hour, k]
+        self.recent_values[weekday, hour, k] = filled
+        self.recent_present[weekday, hour, k] = present
+        self.recent_head[weekday, hour] = (k + 1) % RECENT_WEEKS
+
+    def add(self, when: datetime, values: np.ndarray):
+        weekday, hour = when.weekday(), when.hour
+        present = ~np.isnan(values)
+        self.hist_sum[weekday, hour] += np.where(present, values, 0.0)
+        self.hist_count[weekday, hour] += present
+        self.push_recent(weekday, hour, values)
+        self.last_datetime = when
+
+
+class WeekdayProfileStore:
+    """CityProfile per city with O(1) updates and reads"""
+
+    def __init__(self, columns: List[str] = None):
+        self.columns = list(columns or VALUE_COLUMNS)
+        self.cities: Dict[str, CityProfile] = {}
+
+    @classmethod
+    def from_frame(cls, df: "pd.DataFrame") -> "WeekdayProfileStore":
+        store = cls()
+        store.add_rows(df)
+        return store
+
+    def add(self, city: str, when: datetime, values: np.ndarray) -> bool:
+        """Fold one reading in (self.columns order, NaN = missing); older readings are skipped"""
+        profile = self.cities.setdefault(city, CityProfile(len(self.columns)))
+        if profile.last_datetime is not None and when <= profile.last_datetime:
+            return False
+        profile.add(when, values)
+        return True
+
+    def add_rows(self, df: "pd.DataFrame") -> int:
+        """Fold in hourly rows newer than each city's watermark; returns rows added"""
+        if df is None or df.empty:
+            return 0
+        import pandas as pd
+
+        times = pd.to_datetime(df['Datetime'])
+        values = np.column_stack([
+            pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float) if col in df.columns
+            else np.full(len(df), np.nan)
+            for col in self.columns
+        ])
+        weekdays = times.dt.dayofweek.to_numpy()
+        hours = times.dt.hour.to_numpy()
+        stamps = times.to_numpy()
+        cities = df['City'].to_numpy()
+
+        added = 0
+        for city in pd.unique(cities):
+            profile = self.cities.setdefault(city, CityProfile(len(self.columns)))
+            rows = np.flatnonzero(cities == city)
+            if profile.last_datetime is not None:
+                rows = rows[stamps[rows] > np.datetime64(profile.last_datetime)]
+            if len(rows) == 0:
+                continue
+            rows = rows[np.argsort(stamps[rows], kind='mergesort')]
+
+            present = ~np.isnan(values[rows])
+            np.add.at(profile.hist_sum, (weekdays[rows], hours[rows]), np.where(present, values[rows], 0.0))
+            np.add.at(profile.hist_count, (weekdays[rows], hours[rows]), present)
+
+            # Only the last RECENT_WEEKS readings of each slot reach the rings
+            slot = weekdays[rows] * 24 + hours[rows]
+            from_end = pd.Series(slot[::-1]).groupby(slot[::-1]).cumcount().to_numpy()[::-1]
+            for i in rows[from_end < RECENT_WEEKS]:
+                profile.push_recent(weekdays[i], hours[i], values[i])
+
+            profile.last_datetime = pd.Timestamp(stamps[rows[-1]]).to_pydatetime()
+            added += len(rows)
+        return added
+
+    def profile(self, city: str, weekday: Optional[int] = None, hour: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Historical / recent means and counts for a slot
+
+        weekday or hour may be None to pool over all weekdays or hours
+        (at most 168 slots, independent of how much history there is).
+        """
+        p = self.cities[city]
+        index = (slice(None) if weekday is None else weekday, slice(None) if hour is None else hour)
+
+        def pooled(array):
+            selected = array[index]
+            return selected.reshape(-1, selected.shape[-1]).sum(axis=0)
+
+        hist_sum, hist_count = pooled(p.hist_sum), pooled(p.hist_count)
+        recent_sum, recent_count = pooled(p.recent_sum), pooled(p.recent_count)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return {
+                'historical': hist_sum / hist_count,
+                'recent': recent_sum / recent_count,
+                'historical_count': hist_count,
+                'recent_count': recent_count,
+            }
+
+    def blended(self, city: str, weekday: Optional[int], hour: Optional[int] = None,
+                recent_weight: float = RECENT_WEIGHT, columns: Tuple[str, ...] = BLENDED_COLUMNS) -> Dict[str, float]:
+        """recent_weight * recent mean + rest * historical mean for `columns`,
+        the historical mean (NaN if none) for every other column
+
+        Blended columns fall back to whichever mean exists when the other is missing.
+        """
+        slot = self.profile(city, weekday, hour)
+        historical, recent = slot['historical'], slot['recent']
+        blend = recent_weight * recent + (1 - recent_weight) * historical
+        blend = np.where(np.isnan(recent), historical, np.where(np.isnan(historical), recent, blend))
+        return {col: float(blend[i] if col in columns else historical[i]) for i, col in enumerate(self.columns)}
+
+    def weekday_inputs(self, city: str, weekday: int) -> Tuple[Dict[str, float], int]:
+        """Pollutant inputs for a forecast on `weekday` and the readings behind them
+
+        Pools over all weekdays when the weekday has fewer than
+        MIN_WEEKDAY_SAMPLES readings.
+        """
+        sample_count = int(self.profile(city, weekday)['historical_count'].max())
+        if sample_count < MIN_WEEKDAY_SAMPLES:
+            weekday = None
+        return self.blended(city, weekday), sample_count
+
+    def save(self, path: str = PROFILE_FILE):
+        """Atomically write the store as a compressed .npz"""
+        from artifacts import write_atomic
+
+        arrays = {'columns': np.array(self.columns), 'cities': np.array(list(self.cities), dtype=str)}
+        for i, profile in enumerate(self.cities.values()):
+            for name in CityProfile.ARRAYS:
+                arrays[f'{i}_{name}'] = getattr(profile, name)
+            arrays[f'{i}_last'] = np.array(np.datetime64(profile.last_datetime) if profile.last_datetime
+                                           else np.datetime64('NaT'), dtype='datetime64[s]')
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+        write_atomic(path, buffer.getvalue())
+
+    @classmethod
+    def load_or_new(cls, path: str = PROFILE_FILE) -> "WeekdayProfileStore":
+        """The store saved at path, or an empty one if it is missing or unreadable"""
+        if os.path.exists(path):
+            try:
+                return cls.load(path)
+            except (ValueError, KeyError, OSError) as e:
+                print(f"⚠️ Rebuilding {os.path.basename(path)}: {e}")
+        return cls()
+
+    @classmethod
+    def load(cls, path: str = PROFILE_FILE) -> "WeekdayProfileStore":
+        with np.load(path) as data:
+            columns = [str(col) for col in data['columns']]
+            if columns != VALUE_COLUMNS:
+                raise ValueError(f"{path} was built for different columns")
+            store = cls(columns)
+            for i, city in enumerate(data['cities']):
+                profile = CityProfile(len(store.columns))
+                for name in CityProfile.ARRAYS:
+                    setattr(profile, name, data[f'{i}_{name}'].copy())
+                last = data[f'{i}_last']
+                profile.last_datetime = None if np.isnat(last) else last.item()
+                store.cities[str(city)] = profile
+        return store
@@ -0,0 +1,104 @@
+"""
+Per-worker request statistics shared between forked serving processes
+The table lives in an anonymous shared memory block created before the
+workers are forked, so every worker writes its own row and any worker can
+read all rows (used by /health to report the whole pool).
+"""
+
+import os
+import time
+from multiprocessing.sharedctypes import RawArray
+from typing import Dict, List
+
+FIELDS = (
+    "pid",
+    "started_at",
+    "requests",
+    "errors",
+    "predict_calls",
+    "predictions",
+    "predict_seconds",
+    "last_request_at",
+)
+_FIELD_INDEX = {name: i for i, name in enumerate(FIELDS)}
+
+_table = None
+_slots = 0
+_slot = 0
+
+
+def init(slots: int = 1):
+    """Create the shared table; must run in the parent before forking"""
+    global _table, _slots, _slot
+    _slots = max(1, int(slots))
+    _table = RawArray('d', _slots * len(FIELDS))
+    _slot = 0
+    register(0)
+
+
+def register(slot: int):
+    """Claim a row for the current process (called once in each worker)"""
+    global _slot
+    if _table is None:
+        init(1)
+    _slot = slot
+    base = slot * len(FIELDS)
+    for i in range(len(FIELDS)):
+        _table[base + i] = 0.0
+    _table[base + _FIELD_INDEX["pid"]] = os.getpid()
+    _table[base + _FIELD_INDEX["started_at"]] = time.time()
+
+
+def _add(field: str, amount: float):
+    _table[_slot * len(FIELDS) + _FIELD_INDEX[field]] += amount
+
+
+def record_request(error: bool = False):
+    if _table is None:
+        init(1)
+    _add("requests", 1)
+    if error:
+        _add("errors", 1)
+    _table[_slot * len(FIELDS) + _FIELD_INDEX["last_request_at"]] = time.time()
+
+
+def record_prediction(rows: int, seconds: float):
+    if _table is None:
+        init(1)
+    _add("predict_calls", 1)
+    _add("predictions", rows)
+    _add("predict_seconds", seconds)
+
+
+def snapshot() -> List[Dict]:
+    """Rows for every registered worker"""
+    if _table is None:
+        init(1)
+    workers = []
+    for slot in range(_slots):
+        base = slot * len(FIELDS)
+        row = {name: _table[base + i] for i, name in enumerate(FIELDS)}
+        if not row["pid"]:
+            continue
+        row["slot"] = slot
+        row["pid"] = int(row["pid"])
+        for name in ("requests", "errors", "predict_calls", "predictions"):
+            row[name] = int(row[name])
+        workers.append(row)
+    return workers
+
+
+def summary() -> Dict:
+    """Pool-wide totals plus the per-worker rows"""
+    workers = snapshot()
+    predict_calls = sum(w["predict_calls"] for w in workers)
+    predict_seconds = sum(w["predict_seconds"] for w in workers)
+    return {
+        "worker_count": len(workers),
+        "current_worker": os.getpid(),
+        "requests": sum(w["requests"] for w in workers),
+        "errors": sum(w["errors"] for w in workers),
+        "predictions": sum(w["predictions"] for w in workers),
+        "avg_predict_ms": (predict_seconds / predict_calls * 1000) if predict_calls else None,
+        "workers": workers,
+    }